@@ -0,0 +1,70 @@
+"""
+A local stand-in for the Azure OpenAI chat completions API, answering with canned text after a configurable latency.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+ANSWER = "There were 12 failed builds in the requested period, most of them in the ci pipeline."
+
+
+class FakeOpenAI:
+    """
+    Serves /openai/deployments/{deployment}/chat/completions.
+    Responses wait for the configured latency.
+    Prompt sizes of every request are kept in prompt_characters.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.prompt_characters = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self) -> str:
+        """
+        Starts serving on a free local port in a background thread and returns the base URL.
+        """
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                fake._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _handle(self, request, body):
+        prompt_characters = sum(len(message.get("content", "")) for message in body.get("messages", []))
+        with self._lock:
+            self.requests += 1
+            self.prompt_characters.append(prompt_characters)
+        time.sleep(self.latency)
+
+        tokens = ANSWER.split(" ")
+        usage = {"prompt_tokens": prompt_characters // 4, "completion_tokens": len(tokens), "total_tokens": prompt_characters // 4 + len(tokens)}
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANSWER}}],
+            "usage": usage,
+        }
+        data = json.dumps(payload).encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
@@ -0,0 +1,175 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import TableTransactionError
+from datetime import datetime, timezone
+import itertools
+import operator
+import threading
+
+# Tables are kept at module level so every client of the same table name shares its entities
+_tables = {}
+_lock = threading.Lock()
+_etags = itertools.count(1)
+
+# Operators supported in query filters
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+}
+
+# Counters of the operations performed against every in-memory table
+stats = {"entitiesWritten": 0, "transactions": 0, "queries": 0, "entitiesRead": 0}
+
+class MemoryEntity(dict):
+    """
+    An entity returned by the in-memory table, carrying its etag and timestamp in metadata like a TableEntity.
+    """
+
+    def __init__(self, entity: dict, metadata: dict):
+        super().__init__(entity)
+        self.metadata = metadata
+
+class InMemoryTableClient:
+    """
+    An in-memory stand-in for azure.data.tables.TableClient, implementing the operations this app uses.
+    Registered with clients.set_table_client_factory by the benchmarks.
+    """
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+    def create_table(self):
+        with _lock:
+            if self.table_name in _tables:
+                raise ResourceExistsError(f"Table {self.table_name} already exists")
+            _tables[self.table_name] = {}
+
+    def close(self):
+        pass
+
+    def get_entity(self, partition_key: str, row_key: str, **kwargs):
+        with _lock:
+            stored = self._entities().get((partition_key, row_key))
+            if stored is None:
+                raise ResourceNotFoundError(f"Entity {partition_key}/{row_key} not found in {self.table_name}")
+            stats["entitiesRead"] += 1
+            return MemoryEntity(*stored)
+
+    def create_entity(self, entity: dict, **kwargs):
+        with _lock:
+            if self._key(entity) in self._entities():
+                raise ResourceExistsError(f"Entity {self._key(entity)} already exists in {self.table_name}")
+            self._write(entity)
+
+    def upsert_entity(self, entity: dict, mode: str = "merge", **kwargs):
+        with _lock:
+            self._upsert(entity, mode)
+
+    def update_entity(self, entity: dict, mode: str = "merge", etag: str = None, match_condition=None, **kwargs):
+        with _lock:
+            stored = self._entities().get(self._key(entity))
+            if stored is None:
+                raise ResourceNotFoundError(f"Entity {self._key(entity)} not found in {self.table_name}")
+            if match_condition == MatchConditions.IfNotModified and stored[1]["etag"] != etag:
+                raise ResourceModifiedError(f"Entity {self._key(entity)} was modified")
+            self._upsert(entity, mode)
+
+    def delete_entity(self, partition_key: str, row_key: str, **kwargs):
+        with _lock:
+            self._entities().pop((partition_key, row_key), None)
+
+    def submit_transaction(self, operations: list):
+        with _lock:
+            # Every operation is checked before any is applied, so a failed transaction changes nothing like in table storage
+            entities = self._entities()
+            for index, operation in enumerate(operations):
+                action, entity = operation[0], operation[1]
+                options = operation[2] if len(operation) > 2 else {}
+                stored = entities.get(self._key(entity))
+                if action == "create" and stored is not None:
+                    raise _transaction_error(409, f"{index}:Entity {self._key(entity)} already exists in {self.table_name}")
+                if action == "update" and stored is None:
+                    raise _transaction_error(404, f"{index}:Entity {self._key(entity)} not found in {self.table_name}")
+                if action == "update" and options.get("match_condition") == MatchConditions.IfNotModified and stored[1]["etag"] != options.get("etag"):
+                    raise _transaction_error(412, f"{index}:Entity {self._key(entity)} was modified")
+            stats["transactions"] += 1
+            for operation in operations:
+                action, entity = operation[0], operation[1]
+                options = operation[2] if len(operation) > 2 else {}
+                if action in ("upsert", "update"):
+                    self._upsert(entity, options.get("mode", "merge"))
+                elif action == "create":
+                    self._write(entity)
+                elif action == "delete":
+                    entities.pop(self._key(entity), None)
+
+    def query_entities(self, query_filter: str, parameters: dict = None, select: list = None, **kwargs) -> list:
+        conditions = _parse_filter(query_filter, parameters or {})
+        with _lock:
+            stats["queries"] += 1
+            results = []
+            for entity, metadata in self._entities().values():
+                if all(_field_value(entity, metadata, field) is not None and compare(_field_value(entity, metadata, field), value) for field, compare, value in conditions):
+                    if select:
+                        entity = {key: entity[key] for key in select if key in entity}
+                    results.append(MemoryEntity(entity, metadata))
+            stats["entitiesRead"] += len(results)
+            return results
+
+    def list_entities(self, select: list = None, **kwargs) -> list:
+        return self.query_entities("", select=select)
+
+    def _entities(self) -> dict:
+        return _tables.setdefault(self.table_name, {})
+
+    def _key(self, entity: dict) -> tuple:
+        return (entity["PartitionKey"], entity["RowKey"])
+
+    def _upsert(self, entity: dict, mode):
+        stored = self._entities().get(self._key(entity))
+        if stored is not None and str(mode).lower().endswith("merge"):
+            entity = {**stored[0], **entity}
+        self._write(entity)
+
+    def _write(self, entity: dict):
+        # Table storage does not store null properties
+        entity = {key: value for key, value in entity.items() if value is not None}
+        metadata = {"etag": f"W/\"{next(_etags)}\"", "timestamp": datetime.now(timezone.utc)}
+        self._entities()[self._key(entity)] = (entity, metadata)
+        stats["entitiesWritten"] += 1
+
+def clear():
+    """
+    Removes every in-memory table and resets the counters.
+    """
+    with _lock:
+        _tables.clear()
+        for key in stats:
+            stats[key] = 0
+
+def _transaction_error(status_code: int, message: str) -> TableTransactionError:
+    error = TableTransactionError(message=message)
+    error.status_code = status_code
+    return error
+
+def _field_value(entity: dict, metadata: dict, field: str):
+    # The Timestamp system property is set on every write and returned in the metadata of the entity
+    if field == "Timestamp":
+        return metadata["timestamp"]
+    return entity.get(field)
+
+def _parse_filter(query_filter: str, parameters: dict) -> list:
+    # Only conjunctions of "<field> <operator> <@parameter or 'string'>" are supported
+    conditions = []
+    for clause in [clause.strip() for clause in query_filter.split(" and ") if clause.strip()]:
+        field, operator_name, value = clause.split(" ", 2)
+        if value.startswith("@"):
+            value = parameters[value[1:]]
+        else:
+            value = value.strip("'")
+        conditions.append((field, FILTER_OPERATORS[operator_name], value))
+    return conditions
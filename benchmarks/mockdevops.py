@@ -0,0 +1,210 @@
+"""
+A local HTTP stand-in for the Azure DevOps REST APIs used by the collector, serving synthetic repositories.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from datetime import datetime, timedelta, timezone
+import json
+import random
+import re
+import threading
+import time
+
+# Build reasons of the synthetic builds with their weights
+BUILD_REASONS = [("individualCI", 6), ("pullRequest", 3), ("schedule", 1)]
+
+# Build results of the synthetic builds with their weights
+BUILD_RESULTS = [("succeeded", 80), ("failed", 12), ("partiallySucceeded", 3), ("canceled", 5)]
+
+PIPELINES = ["ci", "pr-validation", "release", "nightly"]
+PEOPLE = ["Ada Lovelace", "Alan Turing", "Grace Hopper", "Edsger Dijkstra", "Barbara Liskov"]
+WORK_ITEM_TYPES = ["User Story", "Bug", "Task"]
+
+
+class MockDevOps:
+    """
+    Serves git/repositories, build/builds, build/builds/{id}, wit/workItems and wit/workitemsbatch for synthetic repositories.
+    Every request waits for the configured latency, list responses are paged with x-ms-continuationtoken.
+    When throttle_concurrency is set, requests beyond that many in flight are rejected with 429 and Retry-After.
+    The number of requests per route is kept in stats.
+    """
+
+    def __init__(self, repositories: dict, page_size: int = 1000, latency: float = 0.0, work_items: int = 500, project_identifier: str = "PROJ", days: int = 90, seed: int = 0, throttle_concurrency: int = None, retry_after: float = 0.5):
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_concurrency = throttle_concurrency
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.work_items = work_items
+        self.project_identifier = project_identifier
+        self.days = days
+        self.random = random.Random(seed)
+        # Build IDs are unique across repositories, as they are in a real project
+        self.repositories = {}
+        for repository_id, count in repositories.items():
+            self.repositories[repository_id] = self._generate_builds(repository_id, count, sum(len(builds) for builds in self.repositories.values()) + 1)
+        self.builds_by_id = {build["id"]: build for builds in self.repositories.values() for build in builds}
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self) -> str:
+        """
+        Starts serving on a free local port in a background thread and returns the base URL.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mock._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                mock._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.stats.values())
+
+    def _count(self, route: str):
+        with self._lock:
+            self.stats[route] = self.stats.get(route, 0) + 1
+
+    def _handle(self, request, body):
+        with self._lock:
+            self.in_flight += 1
+            throttled = self.throttle_concurrency is not None and self.in_flight > self.throttle_concurrency
+        try:
+            time.sleep(self.latency)
+            if throttled:
+                self._count("throttled")
+                return self._send(request, {"message": "Request was blocked due to exceeding usage of resource"}, status=429, headers={"Retry-After": str(self.retry_after)})
+            return self._route(request, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _route(self, request, body):
+        url = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        match = re.match(r"^/[^/]+/[^/]+/_apis/(.+)$", url.path)
+        route = match.group(1) if match else ""
+
+        if route == "git/repositories":
+            self._count("git/repositories")
+            values = [{"id": repository_id, "name": f"repo-{repository_id}"} for repository_id in self.repositories]
+            return self._send(request, {"count": len(values), "value": values})
+        if route == "build/builds":
+            self._count("build/builds")
+            values, token = self._list_builds(query)
+            return self._send(request, {"count": len(values), "value": values}, token)
+        if route.startswith("build/builds/"):
+            self._count("build/builds/{id}")
+            build = self.builds_by_id.get(int(route.split("/")[-1]))
+            return self._send(request, build) if build else self._send(request, {"message": "not found"}, status=404)
+        if route.lower().startswith("wit/workitems/"):
+            self._count("wit/workItems")
+            work_item = self._work_item(int(route.split("/")[-1]))
+            return self._send(request, work_item) if work_item else self._send(request, {"message": "not found"}, status=404)
+        if route.lower() == "wit/workitemsbatch":
+            self._count("wit/workitemsbatch")
+            values = [self._work_item(work_item_id, body.get("fields")) for work_item_id in body.get("ids", [])]
+            return self._send(request, {"count": len(values), "value": values})
+        self._count("unknown")
+        return self._send(request, {"message": f"Unknown route {route}"}, status=404)
+
+    def _send(self, request, payload, continuation_token=None, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        if continuation_token:
+            request.send_header("x-ms-continuationtoken", continuation_token)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _list_builds(self, query: dict):
+        builds = self.repositories.get(query.get("repositoryId"), [])
+        if query.get("minTime"):
+            min_time = _parse(query["minTime"])
+            builds = [build for build in builds if build.get("finishTime") and _parse(build["finishTime"]) >= min_time]
+        start = int(query.get("continuationToken", 0))
+        page = builds[start:start + self.page_size]
+        token = str(start + self.page_size) if start + self.page_size < len(builds) else None
+        return page, token
+
+    def _work_item(self, work_item_id: int, fields: list = None):
+        if not 100 <= work_item_id < 100 + self.work_items:
+            return None
+        all_fields = {
+            "System.Title": f"Work item {work_item_id}",
+            "System.WorkItemType": WORK_ITEM_TYPES[work_item_id % len(WORK_ITEM_TYPES)],
+        }
+        if work_item_id % 4:
+            all_fields["System.Parent"] = 100 + (work_item_id // 4)
+        if fields:
+            all_fields = {key: value for key, value in all_fields.items() if key in fields}
+        return {"id": work_item_id, "fields": all_fields}
+
+    def _generate_builds(self, repository_id: str, count: int, first_id: int = 1) -> list:
+        # Builds finish in ascending order across the window, a few of the newest are still running
+        now = datetime.now(timezone.utc)
+        step = timedelta(days=self.days) / max(count, 1)
+        builds = []
+        for index in range(count):
+            queue_time = now - timedelta(days=self.days) + step * index
+            start_time = queue_time + timedelta(seconds=self.random.randint(5, 300))
+            finish_time = start_time + timedelta(seconds=self.random.randint(60, 3600))
+            reason = self._weighted(BUILD_REASONS)
+            work_item_id = self.random.randrange(100, 100 + self.work_items)
+            branch = f"refs/heads/feature/{self.project_identifier}-{work_item_id}-change"
+            completed = index < count - 2
+            build = {
+                "id": first_id + index,
+                "buildNumber": f"{queue_time:%Y%m%d}.{index + 1}",
+                "status": "completed" if completed else "inProgress",
+                "result": self._weighted(BUILD_RESULTS) if completed else None,
+                "reason": reason,
+                "queueTime": _format(queue_time),
+                "startTime": _format(start_time),
+                "finishTime": _format(finish_time) if completed else None,
+                "sourceBranch": "refs/pull/1/merge" if reason == "pullRequest" else branch,
+                "sourceVersion": f"{index:040x}",
+                "parameters": json.dumps({"system.pullRequest.sourceBranch": branch}),
+                "triggerInfo": {"ci.message": f"Change {index} for {self.project_identifier}-{work_item_id}"},
+                "definition": {"name": self.random.choice(PIPELINES)},
+                "repository": {"id": repository_id, "name": f"repo-{repository_id}"},
+                "requestedFor": {"displayName": self.random.choice(PEOPLE)},
+            }
+            builds.append(build)
+        # List responses are in finish time order, as requested by the collector
+        builds.sort(key=lambda build: (build["finishTime"] is None, build["finishTime"] or ""))
+        return builds
+
+    def _weighted(self, choices: list):
+        return self.random.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def _format(value: datetime) -> str:
+    # Azure devops sends 7 fractional digits
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f") + "0Z"
+
+
+def _parse(value: str) -> datetime:
+    value = re.sub(r"\.(\d+)", lambda match: "." + match.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"))
+    return datetime.fromisoformat(value)
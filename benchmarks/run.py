@@ -0,0 +1,165 @@
+"""
+Offline benchmark of the collector and query apis against a local Azure DevOps stand-in, an in-memory table
+(or Azurite) and a fake OpenAI endpoint.
+
+Usage: python benchmarks/run.py --sizes 100,1000,10000 --latency 0.02
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mockdevops import MockDevOps
+from fakeopenai import FakeOpenAI
+
+# Connection string of the Azurite storage emulator started by docker/docker-compose.azurite.yml
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "TableEndpoint=http://127.0.0.1:10002/devstoreaccount1;"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma separated number of builds of each synthetic repository")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the azure devops stand-in waits before each response")
+    parser.add_argument("--page-size", type=int, default=1000, help="Builds per page of build/builds")
+    parser.add_argument("--throttle-concurrency", type=int, help="Reject requests to the azure devops stand-in with 429 beyond this many in flight")
+    parser.add_argument("--work-items", type=int, default=500, help="Number of distinct work items referenced by builds")
+    parser.add_argument("--storage", choices=["memory", "azurite"], default="memory", help="Table storage backend")
+    parser.add_argument("--queries", type=int, default=20, help="Number of timed queries and prompts per size")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="Seconds the fake openai endpoint waits before answering")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def configure_environment(args, devops_url: str, openai_url: str):
+    # The function apps read their configuration when they are imported, so this must run first
+    os.environ.update({
+        "TOKEN": "benchmark",
+        "ORGANIZATION": "benchmark",
+        "PROJECT": "benchmark",
+        "PROJECT_IDENTIFIER": "PROJ",
+        "DEVOPS_BASE_URL": devops_url,
+        "STORAGE_TABLE_NAME": "benchmarkbuilds",
+        "STORAGE_CONNECTION_STRING": AZURITE_CONNECTION_STRING,
+        "AZURE_OPENAI_ENDPOINT": openai_url,
+        "AZURE_OPENAI_KEY": "benchmark",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "benchmark",
+    })
+    if args.storage == "memory":
+        from shared_code import clients
+        import memorytable
+        clients.set_table_client_factory(memorytable.InMemoryTableClient)
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+
+def run_size(size: int, args, mock: MockDevOps, fake_openai: FakeOpenAI) -> dict:
+    from MetricCollectorWorker import devopshandler
+    from MetricCollectorWorker import workitemcache
+    from MetricQueryApi import openaihandler
+    from MetricQueryApi import promptencoder
+    from MetricQueryApi import workitems
+    from shared_code import querycache
+    import memorytable
+
+    repository_id = f"bench{size}"
+    workitemcache.clear()
+    requests_before = mock.total_requests()
+    throttled_before = mock.stats.get("throttled", 0)
+    rows_before = memorytable.stats["entitiesWritten"]
+
+    # Collect every build of the repository
+    start = time.perf_counter()
+    summary = json.loads(devopshandler.getDetails({"repositoryId": repository_id, "fullRefresh": True}))
+    collect_seconds = time.perf_counter() - start
+    requests = mock.total_requests() - requests_before
+    rows_written = memorytable.stats["entitiesWritten"] - rows_before if args.storage == "memory" else summary["buildsStored"]
+
+    # Query the whole window, cold and then warm from the query cache
+    from_date_time = datetime.now(timezone.utc) - timedelta(days=mock.days + 1)
+    cold, warm = [], []
+    for _ in range(args.queries):
+        querycache.clear()
+        start = time.perf_counter()
+        data = querycache.get_entities(from_date_time)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        data = querycache.get_entities(from_date_time)
+        warm.append(time.perf_counter() - start)
+
+    # Time prompt encoding on its own and a full answer against the fake openai endpoint
+    encode, answer = [], []
+    for _ in range(args.queries):
+        start = time.perf_counter()
+        encoded = promptencoder.encode_entities(workitems.join_work_items(data))
+        encode.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        openaihandler.get_openai_response(data, "How many builds failed and in which pipelines?", "single")
+        answer.append(time.perf_counter() - start)
+
+    return {
+        "builds": size,
+        "buildsSeen": summary["buildsSeen"],
+        "buildsStored": summary["buildsStored"],
+        "collectSeconds": collect_seconds,
+        "buildsPerSecond": summary["buildsSeen"] / collect_seconds if collect_seconds else None,
+        "httpCalls": requests,
+        "httpCallsPerBuild": requests / summary["buildsSeen"] if summary["buildsSeen"] else None,
+        "httpCallsThrottled": mock.stats.get("throttled", 0) - throttled_before,
+        "rowsWritten": rows_written,
+        "rowsWrittenPerSecond": rows_written / collect_seconds if collect_seconds else None,
+        "entitiesQueried": len(data),
+        "coldQuerySeconds": percentiles(cold),
+        "warmQuerySeconds": percentiles(warm),
+        "promptTokens": encoded["tokens"],
+        "promptRows": encoded["rows"],
+        "promptEncodeSeconds": percentiles(encode),
+        "answerSeconds": percentiles(answer),
+    }
+
+
+def print_results(results: list):
+    print(f"{'builds':>8} {'builds/s':>10} {'http/build':>11} {'rows/s':>10} {'query p50':>10} {'query p95':>10} {'warm p50':>10} {'prompt tok':>11} {'answer p50':>11} {'answer p95':>11}")
+    for result in results:
+        print(
+            f"{result['builds']:>8} {result['buildsPerSecond']:>10.1f} {result['httpCallsPerBuild']:>11.3f} {result['rowsWrittenPerSecond']:>10.1f} "
+            f"{result['coldQuerySeconds']['p50']:>10.4f} {result['coldQuerySeconds']['p95']:>10.4f} {result['warmQuerySeconds']['p50']:>10.4f} "
+            f"{result['promptTokens']:>11} {result['answerSeconds']['p50']:>11.4f} {result['answerSeconds']['p95']:>11.4f}"
+        )
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    mock = MockDevOps({f"bench{size}": size for size in sizes}, page_size=args.page_size, latency=args.latency, work_items=args.work_items, throttle_concurrency=args.throttle_concurrency)
+    fake_openai = FakeOpenAI(latency=args.openai_latency)
+    configure_environment(args, mock.start(), fake_openai.start())
+    try:
+        results = [run_size(size, args, mock, fake_openai) for size in sizes]
+    finally:
+        mock.stop()
+        fake_openai.stop()
+
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+#! /usr/bin/env bash
+set -e
+
+# Change current working directory to be the root, regardless of how this script is invoked
+cd "$(dirname "${BASH_SOURCE[0]}")/.." || exit 1
+
+function run_benchmark() {
+  python3 benchmarks/run.py "$@"
+}
+
+function main() {
+  run_benchmark "$@"
+}
+
+main "$@"
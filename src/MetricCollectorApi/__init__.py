@@ -1,23 +1,50 @@
 import azure.functions as func
-from . import devopshandler
+import json
+from shared_code import jobstore
+from shared_code import telemetry
 from . import requesthandler
 import logging
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+def main(req: func.HttpRequest, msg: func.Out[str]) -> func.HttpResponse:
+    # Record the stages of the invocation and log one summary when it ends
+    with telemetry.invocation("MetricCollectorApi"):
+        return handleRequest(req, msg)
+
+
+def handleRequest(req: func.HttpRequest, msg: func.Out[str]) -> func.HttpResponse:
+    # The status of a queued job is read with GET ?jobId=
+    if req.method == "GET":
+        return getJobStatus(req)
     # Get the JSON body of the request sent to func
     try:
-        req = req.get_json()
+        req_body = req.get_json()
     except Exception as e:
         return func.HttpResponse(str(e), status_code=400)
     # Pass the request to request handler to parse the JSON payload
     try:
-        parsedValues = requesthandler.parseRequest(req)
+        parsedValues = requesthandler.parseRequest(req_body)
     except Exception as e:
         return func.HttpResponse(str(e), status_code=400)
-    # Pass the parsed values to devops handler to get more details from azure devops
+    # Record the job and put it on the collection queue, the collection itself is done by MetricCollectorWorker
+    try:
+        job = jobstore.create_job(parsedValues)
+        msg.set(json.dumps(job))
+    except Exception as e:
+        return func.HttpResponse(str(e), status_code=500)
+    statusUrl = req.url.split("?")[0] + "?jobId=" + job["jobId"]
+    body = {"jobId": job["jobId"], "status": "queued", "statusUrl": statusUrl}
+    return func.HttpResponse(json.dumps(body), status_code=202, mimetype="application/json", headers={"Location": statusUrl})
+
+
+def getJobStatus(req: func.HttpRequest) -> func.HttpResponse:
+    jobId = req.params.get("jobId")
+    if not jobId:
+        return func.HttpResponse("Request must contain a jobId", status_code=400)
     try:
-        response = devopshandler.getDetails(parsedValues)
+        job = jobstore.get_job_status(jobId)
     except Exception as e:
         return func.HttpResponse(str(e), status_code=500)
-    return func.HttpResponse(response)
+    if job is None:
+        return func.HttpResponse(f"Job {jobId} was not found", status_code=404)
+    return func.HttpResponse(json.dumps(job), status_code=200, mimetype="application/json")
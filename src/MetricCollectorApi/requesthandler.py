@@ -7,11 +7,29 @@ import logging
 #   "branchIdentifier": string,
 #   "technologyTypes": list"
 # }
+# Optionally "fullRefresh": bool can be sent to ignore the stored high-water mark and re-collect every build
+#
+# Azure DevOps "build completed" service hook payloads are also accepted, only the build in the payload is collected
+# {
+#   "eventType": "build.complete",
+#   "resource": {"id": int, ...}
+# }
+
+# Event type of the azure devops "build completed" service hook
+BUILD_COMPLETE_EVENT_TYPE = "build.complete"
 
 
 # Create def to parse the JSON payload from the webhook, check correct types and return the values
 def parseRequest(req):
     parsedValues = {}
+    # Service hook payloads carry the completed build, its ID is all that is needed to collect it
+    if isinstance(req, dict) and req.get("eventType") == BUILD_COMPLETE_EVENT_TYPE:
+        buildId = (req.get("resource") or {}).get("id")
+        if not isinstance(buildId, int) or isinstance(buildId, bool):
+            raise ValueError("Build completed event does not contain a build id")
+        parsedValues["buildId"] = buildId
+        logging.info(parsedValues)
+        return parsedValues
     try:
         for key in ["repositoryId"]:
             if key in req:
@@ -19,7 +37,15 @@ def parseRequest(req):
                     parsedValues[key] = req[key]
                 else:
                     logging.info(f"Incorrect type for {key} in request")
+        if "fullRefresh" in req:
+            if isinstance(req["fullRefresh"], bool):
+                parsedValues["fullRefresh"] = req["fullRefresh"]
+            else:
+                logging.info("Incorrect type for fullRefresh in request")
     except:
         raise ValueError(f"Request was not formatted correctly in request")
+    # The collection runs later on a worker, so reject requests it could not collect now
+    if "repositoryId" not in parsedValues:
+        raise ValueError("Request must contain a repositoryId")
     logging.info(parsedValues)
     return parsedValues
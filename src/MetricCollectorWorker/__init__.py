@@ -0,0 +1,20 @@
+import azure.functions as func
+import json
+import logging
+from shared_code import telemetry
+from . import jobhandler
+
+
+def main(msg: func.QueueMessage) -> None:
+    """
+    Azure Function entry point. Runs a collection job queued by MetricCollectorApi.
+    The host hands queue messages to the worker in batches, duplicate jobs for the same repository are coalesced by jobhandler.
+
+    Args:
+        msg (func.QueueMessage): The queue message created by jobstore.create_job.
+    """
+    with telemetry.invocation("MetricCollectorWorker"):
+        job = json.loads(msg.get_body().decode("utf-8"))
+        logging.info(f"Running collection job {job['jobId']}, dequeued {msg.dequeue_count} times")
+        # Errors are raised so the host returns the message to the queue and retries it
+        jobhandler.runJob(job, msg.dequeue_count or 1)
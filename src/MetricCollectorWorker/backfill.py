@@ -0,0 +1,189 @@
+"""
+Collects the builds of every git repository in the azure devops project, several repositories at a time.
+The progress of each repository is checkpointed in the backfill table, so an interrupted backfill resumes where it stopped.
+
+Usage, from /src/ with the function app settings in the environment:
+python -m MetricCollectorWorker.backfill [--workers 4] [--repositories id,id] [--full-refresh] [--restart]
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shared_code import telemetry
+from . import config
+from . import devopshandler
+from . import storagehandler
+
+# Minimum seconds between two progress log lines
+PROGRESS_INTERVAL = 5.0
+
+
+class BackfillProgress:
+    """
+    Tracks the repositories and builds collected by every worker of a backfill and logs the overall progress and throughput.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.buildsStored = {}
+        self.start = time.perf_counter()
+        self.lastLog = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, repositoryId, buildsStored, finished=None):
+        """
+        Records the builds stored so far for the repository, and whether it has finished.
+
+        Args:
+            repositoryId (str): The ID of the repository.
+            buildsStored (int): The number of builds stored for the repository so far.
+            finished (str): "completed", "skipped" or "failed" once the repository has finished.
+        """
+        with self.lock:
+            self.buildsStored[repositoryId] = buildsStored
+            if finished == "completed":
+                self.completed += 1
+            elif finished == "skipped":
+                self.skipped += 1
+            elif finished == "failed":
+                self.failed += 1
+            now = time.perf_counter()
+            if finished is None and now - self.lastLog < PROGRESS_INTERVAL:
+                return
+            self.lastLog = now
+            summary = self.summary()
+        logging.info(
+            f"Backfill progress: {summary['completed'] + summary['skipped'] + summary['failed']}/{self.total} repositories, "
+            f"{summary['buildsStored']} builds stored, {summary['buildsPerSecond']:.1f} builds/s"
+        )
+
+    def summary(self):
+        """
+        Returns the overall progress and throughput of the backfill.
+        """
+        seconds = time.perf_counter() - self.start
+        builds = sum(self.buildsStored.values())
+        return {
+            "repositories": self.total,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "buildsStored": builds,
+            "totalSeconds": seconds,
+            "buildsPerSecond": builds / seconds if seconds else 0.0,
+        }
+
+
+def backfillRepository(repository, fullRefresh, restart, progress):
+    """
+    Collects the builds of one repository, checkpointing after every page.
+    Incremental collections resume from the watermark, which advances after every page.
+    Full refreshes resume from the continuation token of the last page that was stored.
+
+    Args:
+        repository (dict): The "id" and "name" of the repository.
+        fullRefresh (bool): Ignore the high-water mark and collect every build.
+        restart (bool): Ignore the checkpoint of a previous backfill.
+        progress (BackfillProgress): The progress of the backfill.
+
+    Returns:
+        dict: The repository ID, its status and the builds stored.
+    """
+    repositoryId = repository["id"]
+    checkpoint = None if restart else storagehandler.get_checkpoint(repositoryId)
+    if checkpoint is not None and checkpoint.get("status") == "completed":
+        progress.update(repositoryId, 0, "skipped")
+        return {"repositoryId": repositoryId, "status": "skipped", "buildsStored": 0}
+
+    # Only a full refresh of the same kind can continue from the checkpointed page
+    resume = checkpoint is not None and fullRefresh and checkpoint.get("fullRefresh") and checkpoint.get("continuationToken")
+    state = {
+        "repositoryName": repository.get("name"),
+        "status": "running",
+        "fullRefresh": fullRefresh,
+        "continuationToken": checkpoint["continuationToken"] if resume else None,
+        "buildsStored": checkpoint.get("buildsStored", 0) if resume else 0,
+    }
+    if resume:
+        logging.info(f"Resuming backfill of {repositoryId} after {state['buildsStored']} builds")
+    storagehandler.set_checkpoint(repositoryId, state)
+    buildsBefore = state["buildsStored"]
+
+    def onPage(nextToken, summary):
+        state["continuationToken"] = nextToken if fullRefresh else None
+        state["buildsStored"] = buildsBefore + summary["buildsStored"]
+        storagehandler.set_checkpoint(repositoryId, state)
+        progress.update(repositoryId, state["buildsStored"])
+
+    try:
+        devopshandler.getBuildInfo(repositoryId, fullRefresh, state["continuationToken"], onPage)
+    except Exception as e:
+        logging.error(f"Backfill of {repositoryId} failed: {e}")
+        state.update({"status": "failed", "error": str(e)[:1000]})
+        storagehandler.set_checkpoint(repositoryId, state)
+        progress.update(repositoryId, state["buildsStored"], "failed")
+        return {"repositoryId": repositoryId, "status": "failed", "buildsStored": state["buildsStored"], "error": str(e)}
+
+    state.update({"status": "completed", "continuationToken": None})
+    storagehandler.set_checkpoint(repositoryId, state)
+    progress.update(repositoryId, state["buildsStored"], "completed")
+    return {"repositoryId": repositoryId, "status": "completed", "buildsStored": state["buildsStored"]}
+
+
+def runBackfill(repositoryIds=None, fullRefresh=False, restart=False, workers=None):
+    """
+    Collects the builds of every repository in the project, or of the given repositories, concurrently.
+    Repositories completed by a previous backfill are skipped unless restart is set.
+
+    Args:
+        repositoryIds (list): The IDs of the repositories to collect, every repository in the project when not given.
+        fullRefresh (bool): Ignore the high-water marks and collect every build.
+        restart (bool): Ignore the checkpoints of a previous backfill.
+        workers (int): The number of repositories collected concurrently, defaults to BACKFILL_WORKERS.
+
+    Returns:
+        dict: The overall progress and throughput with the result of each repository.
+    """
+    if repositoryIds:
+        repositories = [{"id": repositoryId, "name": None} for repositoryId in repositoryIds]
+    else:
+        repositories = devopshandler.getRepositories()
+    logging.info(f"Backfilling {len(repositories)} repositories")
+
+    progress = BackfillProgress(len(repositories))
+    results = []
+    if repositories:
+        # Threads rather than processes, so every repository shares the request governor and its view of throttling
+        with ThreadPoolExecutor(max_workers=min(workers or config.backfill_workers, len(repositories))) as executor:
+            backfill = telemetry.propagate(lambda repository: backfillRepository(repository, fullRefresh, restart, progress))
+            results = list(executor.map(backfill, repositories))
+
+    summary = progress.summary()
+    summary["results"] = results
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="Number of repositories collected concurrently, defaults to BACKFILL_WORKERS")
+    parser.add_argument("--repositories", help="Comma separated IDs of the repositories to collect, defaults to every repository in the project")
+    parser.add_argument("--full-refresh", action="store_true", help="Ignore the high-water marks and collect every build")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoints of a previous backfill and start over")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    repositoryIds = [repositoryId.strip() for repositoryId in args.repositories.split(",")] if args.repositories else None
+    with telemetry.invocation("MetricCollectorBackfill"):
+        summary = runBackfill(repositoryIds, args.full_refresh, args.restart, args.workers)
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
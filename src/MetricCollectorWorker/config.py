@@ -0,0 +1,77 @@
+import os
+import base64
+
+try:
+    # Encode the token using base64 encoding and store it in the auth variable
+    auth = str(base64.b64encode(bytes(":" + os.environ["TOKEN"], "ascii")), "ascii")
+
+    if os.environ.get("STORAGE_CONNECTION_STRING"):
+        # Retrieve the storage connection string from the environment variables and store it in the storage_connection_string variable
+        storage_connection_string = os.environ.get("STORAGE_CONNECTION_STRING")
+        # Set the storage_account_name and storage_account_key variables to None if connection string is used
+        storage_account_name = None
+        storage_account_key = None
+    else:
+        # Retrieve the storage account name from the environment variables and store it in the storage_account_name variable
+        storage_account_name = os.environ.get("STORAGE_ACCOUNT_NAME")
+        # Retrieve the storage account key from the environment variables and store it in the storage_account_key variable
+        storage_account_key = os.environ.get("STORAGE_ACCOUNT_KEY")
+        # Set the storage_connection_string variable to None if account name and key are used
+        storage_connection_string = None
+
+    # Retrieve the table name from the environment variables and store it in the table_name variable
+    storage_table_name = os.environ.get("STORAGE_TABLE_NAME")
+
+    # Base URL of azure devops, can be pointed at a local stand-in for testing and benchmarks
+    devops_base_url = os.environ.get("DEVOPS_BASE_URL", "https://dev.azure.com/")
+
+    # Get project identifier used to get the work item from branches
+    project_identifier = os.environ.get("PROJECT_IDENTIFIER")
+
+    # Number of table transactions submitted concurrently when storing rows
+    storage_writer_workers = int(os.environ.get("STORAGE_WRITER_WORKERS", "4"))
+
+    # Number of times a throttled or transient table transaction failure is retried
+    storage_max_retries = int(os.environ.get("STORAGE_MAX_RETRIES", "4"))
+
+    # Table holding a copy of every build partitioned by the day it finished, used for time range queries
+    time_index_table_name = os.environ.get("TIME_INDEX_TABLE_NAME", "buildsbyday")
+
+    # Table holding the attributes of every work item referenced by a build, keyed by work item id
+    work_item_table_name = os.environ.get("WORK_ITEM_TABLE_NAME", "workitems")
+
+    # Table holding daily rollups of builds per repository and pipeline
+    rollup_table_name = os.environ.get("ROLLUP_TABLE_NAME", "buildrollups")
+
+    # Table used to store the per repository high-water mark of collected builds
+    watermark_table_name = os.environ.get("WATERMARK_TABLE_NAME", "watermarks")
+
+    # Number of times a job is taken from the collection queue before it is poisoned, must match maxDequeueCount in host.json
+    job_max_dequeue_count = int(os.environ.get("JOB_MAX_DEQUEUE_COUNT", "10"))
+
+    # Table used to checkpoint the progress of each repository during a backfill
+    backfill_table_name = os.environ.get("BACKFILL_TABLE_NAME", "backfill")
+
+    # Number of repositories collected concurrently during a backfill
+    backfill_workers = int(os.environ.get("BACKFILL_WORKERS", "4"))
+
+    # Number of concurrent requests used when enriching builds with data from azure devops
+    enrichment_workers = int(os.environ.get("ENRICHMENT_WORKERS", "8"))
+
+    # Number of times a throttled or failed azure devops request is retried
+    devops_max_retries = int(os.environ.get("DEVOPS_MAX_RETRIES", "5"))
+
+    # Seconds to wait for azure devops to respond before the request is retried
+    devops_request_timeout = float(os.environ.get("DEVOPS_REQUEST_TIMEOUT_SECONDS", "30"))
+
+    # Bounds of the number of concurrent azure devops requests, the limit adapts to throttling within these bounds
+    devops_min_concurrency = int(os.environ.get("DEVOPS_MIN_CONCURRENCY", "1"))
+    devops_max_concurrency = int(os.environ.get("DEVOPS_MAX_CONCURRENCY", str(enrichment_workers)))
+
+    # Maximum number of work items held in the in-process work item cache
+    work_item_cache_size = int(os.environ.get("WORK_ITEM_CACHE_SIZE", "1024"))
+
+    # Number of seconds a cached work item is considered fresh, in memory and in the work item table
+    work_item_cache_ttl = int(os.environ.get("WORK_ITEM_CACHE_TTL_SECONDS", "3600"))
+except:
+    raise exit("Error in environment variables")
@@ -0,0 +1,424 @@
+import json
+import logging
+import re
+import time
+from urllib.parse import quote
+from . import devopshelpers
+from . import storagehandler
+from . import workitemcache
+from . import config
+from shared_code import telemetry
+
+# Maximum number of work items the azure devops work items batch API accepts per call
+WORK_ITEM_BATCH_SIZE = 200
+
+# Work item fields read by parseWorkItemFields, the only ones requested from the batch API
+WORK_ITEM_FIELDS = ["System.Title", "System.WorkItemType", "System.Parent"]
+
+
+def getBuildInfo(repositoryId, fullRefresh=False, continuationToken=None, onPage=None):
+    """
+    Get the build info from azure devops based on repository id and store it in azure table.
+    Only builds that finished after the stored high-water mark of the repository are collected.
+    Builds are streamed page by page, each page is filtered, enriched and stored while the next one is fetched.
+
+    Args:
+    repositoryId (int): The ID of the repository
+    fullRefresh (bool): Ignore the high-water mark and collect every build
+    continuationToken (str): Start from this page of a previous full refresh instead of the first page
+    onPage (callable): Called with the continuation token of the next page and the summary after each page is stored
+
+    Returns:
+    dict: A summary of the collection with counts and timings
+    """
+    # Only ask for builds that finished since the last collection, oldest first so the watermark can advance
+    options = ["&queryOrder=finishTimeAscending"]
+    watermark = None if fullRefresh else storagehandler.get_watermark(repositoryId)
+    if watermark:
+        logging.info(f"Collecting builds that finished since {watermark}")
+        options.append("&minTime=" + quote(watermark))
+
+    # Construct URL for querying azure devops build API
+    url = devopshelpers.constructURL("build", repositoryId, options)
+    logging.info(url)
+
+    summary = {
+        "repositoryId": repositoryId,
+        "pages": 0,
+        "buildsSeen": 0,
+        "buildsSkipped": 0,
+        "buildsStored": 0,
+        "rowsRetried": 0,
+        "rollupsFailed": 0,
+        "watermark": watermark,
+        "fetchSeconds": 0.0,
+        "enrichSeconds": 0.0,
+        "storeSeconds": 0.0,
+    }
+    startTime = time.perf_counter()
+
+    pages = devopshelpers.getPages(url, continuationToken)
+    while True:
+        # Wait for the next page, it is fetched in the background while the previous one was processed
+        fetchStart = time.perf_counter()
+        page = next(pages, None)
+        summary["fetchSeconds"] += time.perf_counter() - fetchStart
+        if page is None:
+            break
+        response, nextToken = page
+        summary["pages"] += 1
+        summary["buildsSeen"] += len(response)
+
+        enrichStart = time.perf_counter()
+        try:
+            builds = filterBuilds(response)
+            buildInfo, workItems = enrichBuilds(builds)
+        except Exception as e:
+            raise ValueError("Error in request to get build info from azure devops: " + str(e))
+        summary["enrichSeconds"] += time.perf_counter() - enrichStart
+        summary["buildsSkipped"] += len(response) - len(builds)
+
+        storeStart = time.perf_counter()
+        try:
+            counts = storagehandler.store_builds(buildInfo, workItems)
+        except Exception as e:
+            raise ValueError("Error in storing build info in azure table:" + str(e))
+        summary["storeSeconds"] += time.perf_counter() - storeStart
+        summary["buildsStored"] += counts["written"]
+        summary["rowsRetried"] += counts["retried"]
+        summary["rollupsFailed"] += counts["rollupsFailed"]
+
+        # Stop before moving the watermark past rows that could not be stored, so the next run picks them up again
+        if counts["failed"]:
+            raise ValueError(f"Error in storing build info in azure table: {counts['failed']} rows failed")
+
+        # Builds are in finish time order, so the last completed one is the new high-water mark
+        completedBuilds = [build for build in response if build["status"] == "completed"]
+        if completedBuilds:
+            summary["watermark"] = completedBuilds[-1]["finishTime"]
+            storagehandler.set_watermark(repositoryId, completedBuilds[-1]["finishTime"], completedBuilds[-1]["id"])
+
+        if onPage is not None:
+            onPage(nextToken, summary)
+
+    summary["totalSeconds"] = time.perf_counter() - startTime
+    summary["devopsConcurrencyLimit"] = int(devopshelpers.governor.limit)
+    logging.info(f"Work item cache stats: {workitemcache.stats}")
+    logging.info(f"Azure DevOps request governor stats: {devopshelpers.governor.stats}")
+    return summary
+
+
+def getCompletedBuildInfo(buildId):
+    """
+    Get the build info of a single build from azure devops and store it in azure table, used for build completed events.
+    Costs one request for the build, one for its work item on a cache miss and one write per table, however many builds the repository has.
+    The high-water mark is left alone so the next collection of the repository still picks up builds that finished before this one.
+
+    Args:
+    buildId (int): The ID of the build
+
+    Returns:
+    dict: A summary of the collection with counts and timings
+    """
+    startTime = time.perf_counter()
+    url = devopshelpers.constructURL("buildById", str(buildId))
+    build = devopshelpers.sendRequest(url)
+
+    summary = {
+        "buildId": buildId,
+        "repositoryId": build["repository"]["id"],
+        "buildsSeen": 1,
+        "buildsSkipped": 0,
+        "buildsStored": 0,
+        "rollupsFailed": 0,
+    }
+    # Apply the same filters as a collection of the whole repository
+    builds = filterBuilds([build])
+    if builds:
+        try:
+            # The batch API omits work items that do not exist, so a branch naming a deleted work item stores the build without one
+            buildInfo, workItems = enrichBuilds(builds)
+        except Exception as e:
+            raise ValueError("Error in request to get build info from azure devops: " + str(e))
+        counts = storagehandler.store_builds(buildInfo, workItems)
+        if counts["failed"]:
+            raise ValueError(f"Error in storing build info in azure table: {counts['failed']} rows failed")
+        summary["buildsStored"] = counts["written"]
+        summary["rollupsFailed"] = counts["rollupsFailed"]
+    else:
+        summary["buildsSkipped"] = 1
+
+    summary["totalSeconds"] = time.perf_counter() - startTime
+    return summary
+
+
+def filterBuilds(builds):
+    """
+    Get the builds that should be stored from a page of builds
+
+    Args:
+    builds (list): The builds as returned by azure devops
+
+    Returns:
+    list: The completed builds that were not scheduled
+    """
+    filteredBuilds = []
+    for build in builds:
+        # If the build reason is schedule then skip it
+        if build["reason"] == "schedule":
+            logging.info("Skipping a scheduled build")
+            continue
+        if build["status"] != "completed":
+            logging.info("Skipping build where status is not completed")
+            continue
+        else:
+            filteredBuilds.append(build)
+    return filteredBuilds
+
+
+def enrichBuilds(builds):
+    """
+    Get the build info for a list of builds, resolving their work items in batches
+
+    Args:
+    builds (list): The builds as returned by azure devops
+
+    Returns:
+    tuple: A list of dictionaries containing the build info, in the same order as the builds,
+    and the work item info of the builds keyed by work item id
+    """
+    # Resolve the work items of every build up front so they can be fetched in batches
+    workItemIds = {getWorkItemId(getSourceBranch(build)) for build in builds}
+    workItems = getWorkItemInfoBatch([workItemId for workItemId in workItemIds if workItemId != ""])
+
+    buildInfo = []
+    for build in builds:
+        logging.info("Getting build info for build: " + build["buildNumber"])
+        with telemetry.span("collector.enrich"):
+            buildInfo.append(getBuild(build))
+    return buildInfo, workItems
+
+
+def parseWorkItemFields(fields):
+    """
+    Get the work item info from the fields of a work item payload
+
+    Args:
+    fields (dict): The fields of the work item as returned by azure devops
+
+    Returns:
+    dict: The work item info
+    """
+    if "System.Parent" in fields:
+        parentWorkItemId = fields["System.Parent"]
+        parentWorkItemTitle = fields["System.Title"]
+    else:
+        parentWorkItemId = None
+        parentWorkItemTitle = None
+    try:
+        workItemInfo = {
+            "title": fields["System.Title"],
+            "workItemType": fields["System.WorkItemType"],
+            "parentWorkItemId": parentWorkItemId,
+            "parentWorkItemTitle": parentWorkItemTitle,
+        }
+        logging.info(workItemInfo)
+    except:
+        raise ValueError("Error in request to get work item info from azure devops")
+    return workItemInfo
+
+
+def getWorkItemInfoBatch(workItemIds):
+    """
+    Get the work item info for many work items using the azure devops work items batch API.
+    Cached work items are not requested again, they are looked up concurrently as a miss in memory reads the work item table.
+
+    Args:
+    workItemIds (list): The IDs of the work items
+
+    Returns:
+    dict: The work item info keyed by work item id, work items that could not be found are left out
+    """
+    workItemIds = list(workItemIds)
+    workItems = {}
+    missingIds = []
+    for workItemId, workItemInfo in zip(workItemIds, devopshelpers.mapConcurrently(workitemcache.get, workItemIds)):
+        if workItemInfo is None:
+            missingIds.append(workItemId)
+        else:
+            workItems[workItemId] = workItemInfo
+
+    # Construct URL for querying azure devops work items batch API
+    url = devopshelpers.constructURL("workItemsBatch", "")
+
+    # Request the missing work items in chunks, asking only for the fields that are read
+    def requestChunk(chunk):
+        body = {
+            "ids": [int(workItemId) for workItemId in chunk],
+            "fields": WORK_ITEM_FIELDS,
+            "errorPolicy": "omit",
+        }
+        return devopshelpers.sendRequest(url, body)
+
+    chunks = [missingIds[i:i + WORK_ITEM_BATCH_SIZE] for i in range(0, len(missingIds), WORK_ITEM_BATCH_SIZE)]
+    for response in devopshelpers.mapConcurrently(requestChunk, chunks):
+        # Work items that do not exist are returned as null when errors are omitted
+        for workItem in response["value"]:
+            if workItem is None:
+                continue
+            workItemId = str(workItem["id"])
+            workItems[workItemId] = parseWorkItemFields(workItem["fields"])
+            workitemcache.put(workItemId, workItems[workItemId])
+
+    logging.info(f"Resolved {len(workItems)} of {len(workItemIds)} work items, {len(missingIds)} requested from azure devops")
+    return workItems
+
+
+def getBuild(build):
+    """
+    Get the build info from the build dictionary.
+    Only the work item id is kept, the work item info is stored once per work item in the work item table.
+
+    Args:
+    build (dict): The build dictionary
+
+    Returns:
+    dict: A dictionary containing the build info
+    """
+
+    # Get the source branch from the build dictionary
+    sourceBranch = getSourceBranch(build)
+
+    # Using the source branch, get the work item id
+    workItemId = getWorkItemId(sourceBranch)
+
+    ciMessage = getCiMessageFromBuild(build)
+
+    return {
+        "PartitionKey": build["repository"]["name"],
+        "RowKey": build["buildNumber"],
+        "sourceBranch": sourceBranch,
+        "pipelineName": build["definition"]["name"],
+        "repositoryId": build["repository"]["id"],
+        "result": build["result"],
+        "queueTime": build["queueTime"],
+        "startTime": build["startTime"],
+        "finishTime": build["finishTime"],
+        "buildReason": build["reason"],
+        "ciMessage": ciMessage,
+        "requestedFor": build["requestedFor"]["displayName"],
+        "workItemId": workItemId,
+    }
+
+
+def getSourceBranch(build):
+    """
+    Given a build dictionary, returns the source branch the build ran against.
+    For pull request builds this is the source branch of the pull request.
+
+    Args:
+        build (dict): A dictionary containing information about the build.
+
+    Returns:
+        str: A string containing the source branch of the build.
+    """
+    if build["reason"] == "pullRequest":
+        return getSourceBranchFromPullRequest(build)
+    return build["sourceBranch"]
+
+
+def getSourceBranchFromPullRequest(build):
+    """
+    Given a build dictionary, returns the source branch associated with the pull request.
+    The source branch is extracted from the build's parameters dictionary.
+
+    Args:
+        build (dict): A dictionary containing information about the build.
+
+    Returns:
+        str: A string containing the source branch associated with the pull request.
+    """
+    try:
+        parameters = build["parameters"]
+        parametersFixed = re.sub(r"\\", "", parameters)
+        parametersJson = json.loads(parametersFixed)
+        return parametersJson["system.pullRequest.sourceBranch"]
+    except:
+        logging.info("Error in getting source branch from pull request")
+        return ""
+
+
+def getCiMessageFromBuild(build):
+    """
+    Given a build dictionary, returns the CI message associated with that build.
+    If the build reason is "pullRequest", the source version is returned.
+    Otherwise, the CI message is taken from the build's triggerInfo.
+
+    Args:
+        build (dict): A dictionary containing information about the build.
+
+    Returns:
+        str: A string containing the CI message associated with the build.
+    """
+    try:
+        if build["reason"] == "pullRequest":
+            return build["sourceVersion"]
+        if build["reason"] == "individualCI":
+            return build["triggerInfo"]["ci.message"]
+        else:
+            return ""
+    except:
+        logging.info("Error in getting ciMessage")
+
+
+def getWorkItemId(branchIdentifier):
+    """
+    Given a branch identifier, returns the work item ID associated with that branch.
+    The work item ID is extracted from the branch identifier using a regular expression.
+
+    Args:
+        branchIdentifier (str): A string containing the branch identifier.
+
+    Returns:
+        str: A string containing the work item ID associated with the branch.
+    """
+    logging.info("Getting work item id from branch identifier")
+    logging.info(branchIdentifier)
+    projectIdentifier = config.project_identifier
+    regex = r"(?<="+projectIdentifier+"-)([1-9]\d+)"
+    backup_regex = r"[1-9]\d{0,4}"
+    if re.search(regex, branchIdentifier):
+        workItemId = re.findall(regex, branchIdentifier)
+        logging.info("First regex matched: " + workItemId[0])
+        return workItemId[0]
+    elif re.search(backup_regex, branchIdentifier):
+        workItemId = re.findall(backup_regex, branchIdentifier)
+        logging.info("Second regex matched: " + workItemId[0])
+        return workItemId[0]
+    else:
+        logging.info("Used both regexs and could not get work item id")
+        return ""
+
+# Get the ID and name of every git repository in the project
+def getRepositories():
+    url = devopshelpers.constructURL("repositories", "")
+    return [{"id": repository["id"], "name": repository["name"]} for repository in devopshelpers.sendRequest(url)["value"]]
+
+
+# Get details from azure devops based on JSON payload
+def getDetails(dict):
+    # Build completed events only collect the build that completed
+    if "buildId" in dict:
+        summary = getCompletedBuildInfo(dict["buildId"])
+        logging.info(summary)
+        return json.dumps(summary)
+
+    # Get repositoryId from parsedValues dict
+    repositoryId = dict["repositoryId"]
+
+    # Collect and store the build info of the repository
+    summary = getBuildInfo(repositoryId, dict.get("fullRefresh", False))
+    logging.info(summary)
+
+    # Return the collection summary as JSON
+    return json.dumps(summary)
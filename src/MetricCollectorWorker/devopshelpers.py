@@ -0,0 +1,134 @@
+import os
+import re
+import requests
+import logging
+from urllib.parse import quote, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from shared_code import clients
+from shared_code import telemetry
+from . import config
+from .requestgovernor import RequestGovernor, RETRY_STATUS_CODES
+
+# The governor lives at module level so every thread of the worker shares the same concurrency limit
+governor = RequestGovernor(config.devops_min_concurrency, config.devops_max_concurrency)
+
+# Get the HTTP session shared by every request on this worker so connections to azure devops are kept alive
+def getSession():
+    # Size the connection pool so every enrichment worker can hold a connection
+    return clients.get_http_session("devops", config.enrichment_workers)
+
+
+# Call function for every item using the enrichment worker pool, results are returned in input order
+def mapConcurrently(function, items):
+    items = list(items)
+    if len(items) <= 1 or config.enrichment_workers <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(config.enrichment_workers, len(items))) as executor:
+        return list(executor.map(telemetry.propagate(function), items))
+
+
+# Send request to azure devops and return JSON payload
+
+
+def sendRequest(url, body=None):
+    data, _ = sendRequestWithContinuation(url, body)
+    return data
+
+
+# Send request to azure devops and return the JSON payload with the continuation token of the next page, if any.
+# Requests are throttled by the governor, throttled and failed requests are retried. Every request sent here only reads,
+# including the batch POSTs, so they are all safe to retry.
+def sendRequestWithContinuation(url, body=None):
+    # Create the authorization header for the request
+    headers = {"Authorization": "Basic " + config.auth}
+    api = getUrlTemplate(url)
+    for attempt in range(config.devops_max_retries + 1):
+        lastAttempt = attempt == config.devops_max_retries
+        # Send the request to azure devops and store the response, POST is only used for read-only batch queries
+        governor.acquire()
+        try:
+            with telemetry.span("devops.request", api=api) as attributes:
+                if body is None:
+                    response = getSession().get(url, headers=headers, timeout=config.devops_request_timeout)
+                else:
+                    response = getSession().post(url, headers=headers, json=body, timeout=config.devops_request_timeout)
+                attributes["status"] = str(response.status_code)
+                attributes["bytes"] = len(response.content)
+        except requests.exceptions.RequestException as e:
+            if lastAttempt:
+                raise ValueError(f"Unable to reach Azure DevOps for {api}: {e}")
+            logging.info(f"Retrying {api} after error: {e}")
+            governor.waitBeforeRetry(attempt)
+            continue
+        finally:
+            governor.release()
+        retryAfter = governor.onResponse(response.status_code, response.headers)
+        if response.status_code in RETRY_STATUS_CODES and not lastAttempt:
+            logging.info(f"Retrying {api} after status code {response.status_code}")
+            governor.waitBeforeRetry(attempt, retryAfter)
+            continue
+        break
+    if response.status_code >= 400:
+        raise ValueError(f"Azure DevOps returned status code {response.status_code} for {api}: {response.text[:200]}")
+    # Parse the response as JSON
+    try:
+        data = response.json()
+    except ValueError:
+        logging.info("Response not parseable: " + str(response.content))
+        logging.info("Status code of response was: " + str(response.status_code))
+        raise ValueError("Response from Azure DevOps was not in JSON format")
+    # Return the response
+    return data, response.headers.get("x-ms-continuationtoken")
+
+
+# Yield every page of a list API as (values, continuationToken), following continuation tokens to the end.
+# The next page is fetched in the background while the caller processes the current one.
+def getPages(url, continuationToken=None):
+    def fetch(token):
+        pageUrl = url + ("&continuationToken=" + quote(token) if token else "")
+        return sendRequestWithContinuation(pageUrl)
+
+    fetch = telemetry.propagate(fetch)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch, continuationToken)
+        while future is not None:
+            data, nextToken = future.result()
+            future = executor.submit(fetch, nextToken) if nextToken else None
+            yield data["value"], nextToken
+
+
+# Get the path of an azure devops URL with IDs replaced by a placeholder, used to group requests by API
+def getUrlTemplate(url):
+    path = urlparse(url).path
+    path = path.split("/_apis/", 1)[-1]
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+
+# Construct URL for querying different azure devops APIs
+def constructURL(apiType, id, extraOptions=None):
+    # Friendly map of apiTypes
+    apiTypes = {
+        "pullRequest": {"apiPath": "git/pullRequests/" + id, "options": []},
+        "workItemsBatch": {"apiPath": "wit/workitemsbatch", "options": []},
+        "repositories": {"apiPath": "git/repositories", "options": []},
+        "buildById": {"apiPath": "build/builds/" + id, "options": []},
+        "build": {
+            "apiPath": "build/builds",
+            "options": ["&repositoryId=" + id, "&repositoryType=TfsGit"],
+        },
+    }
+    # Construct the base URL for azure devops metrics queries based on the apiTypes map
+    url = (
+        config.devops_base_url.rstrip("/")
+        + "/"
+        + os.environ["ORGANIZATION"]
+        + "/"
+        + os.environ["PROJECT"]
+        + "/_apis/"
+        + apiTypes[apiType]["apiPath"]
+        + "?api-version=7.0"
+        + "".join(apiTypes[apiType]["options"])
+        + "".join(extraOptions or [])
+    )
+    # Return the URL as string
+    return url
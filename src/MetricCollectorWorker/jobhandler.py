@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime, timezone
+from shared_code import jobstore
+from . import config
+from . import devopshandler
+
+
+def runJob(job, dequeueCount=1):
+    """
+    Runs a queued collection job unless a collection of the same builds that started after it was queued covers it.
+    When an earlier collection of the same builds is still running the job is left waiting and an error is raised,
+    so the message returns to the queue and is retried once its visibility timeout has passed.
+    On its last dequeue a job that is still waiting fails instead, so its status does not stay waiting once the message is poisoned.
+
+    Args:
+        job (dict): The queue message created by jobstore.create_job.
+        dequeueCount (int): The number of times the message has been taken from the queue.
+
+    Returns:
+        str: The final status of the job, "completed", "coalesced" or "failed".
+    """
+    jobId = job["jobId"]
+    collectionKey = jobstore.get_collection_key(job["request"])
+    outcome, otherJobId = jobstore.acquire_collection_lease(collectionKey, jobId, datetime.fromisoformat(job["queuedAt"]))
+
+    if outcome == "covered":
+        logging.info(f"Collection job {jobId} is covered by job {otherJobId}")
+        jobstore.set_job(jobId, {"status": "coalesced", "coalescedInto": otherJobId, "attempts": dequeueCount, "finishedAt": _now()})
+        return "coalesced"
+    if outcome == "busy":
+        # The message is poisoned after its last dequeue, so give up and record why instead of leaving the job waiting forever
+        if dequeueCount >= config.job_max_dequeue_count:
+            logging.info(f"Collection job {jobId} gave up waiting for job {otherJobId}")
+            jobstore.set_job(jobId, {"status": "failed", "waitingFor": otherJobId, "attempts": dequeueCount, "error": f"{collectionKey} was still being collected by job {otherJobId}", "finishedAt": _now()})
+            return "failed"
+        jobstore.set_job(jobId, {"status": "waiting", "waitingFor": otherJobId, "attempts": dequeueCount})
+        raise ValueError(f"{collectionKey} is being collected by job {otherJobId}, job {jobId} will be retried")
+
+    jobstore.set_job(jobId, {"status": "running", "startedAt": _now(), "attempts": dequeueCount})
+    try:
+        summary = devopshandler.getDetails(job["request"])
+    except Exception as e:
+        jobstore.release_collection_lease(collectionKey, jobId, "failed")
+        jobstore.set_job(jobId, {"status": "failed", "error": str(e)[:1000], "finishedAt": _now()})
+        raise
+    jobstore.release_collection_lease(collectionKey, jobId, "completed")
+    jobstore.set_job(jobId, {"status": "completed", "summary": summary, "error": "", "finishedAt": _now()})
+    return "completed"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,133 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Status codes of azure devops responses that are retried
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Status codes that mean azure devops is throttling the caller
+THROTTLE_STATUS_CODES = {429, 503}
+
+# The concurrency limit is lowered when less than this fraction of the rate limit is left
+RATE_LIMIT_LOW_FRACTION = 0.1
+
+# Minimum seconds between two decreases of the concurrency limit, so a burst of throttled responses only halves it once
+DECREASE_INTERVAL = 1.0
+
+# Base and maximum delay of the exponential backoff when azure devops gives no delay
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 60.0
+
+
+class RequestGovernor:
+    """
+    Limits the number of concurrent requests to azure devops and adapts the limit to throttling.
+    The limit grows by one request per round of successful responses and is halved when a response is throttled
+    or reports that the rate limit is nearly used up (additive increase, multiplicative decrease).
+    A Retry-After header pauses every request until the delay has passed.
+    """
+
+    def __init__(self, minConcurrency, maxConcurrency):
+        self.minConcurrency = max(1, minConcurrency)
+        self.maxConcurrency = max(self.minConcurrency, maxConcurrency)
+        self.limit = float(self.maxConcurrency)
+        self.inFlight = 0
+        self.pausedUntil = 0.0
+        self.lastDecrease = 0.0
+        self.condition = threading.Condition()
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "decreases": 0}
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+        """
+        with self.condition:
+            while True:
+                wait = self.pausedUntil - time.monotonic()
+                if wait <= 0 and self.inFlight < int(self.limit):
+                    self.inFlight += 1
+                    self.stats["requests"] += 1
+                    return
+                self.condition.wait(wait if wait > 0 else None)
+
+    def release(self):
+        """
+        Marks a request acquired with acquire as finished.
+        """
+        with self.condition:
+            self.inFlight -= 1
+            self.condition.notify_all()
+
+    def onResponse(self, statusCode, headers):
+        """
+        Adjusts the concurrency limit to the status code and rate limit headers of a response.
+
+        Args:
+            statusCode (int): The status code of the response.
+            headers (dict): The headers of the response.
+
+        Returns:
+            float: The number of seconds azure devops asked to wait before the next request, or None.
+        """
+        retryAfter = parseRetryAfter(headers.get("Retry-After"))
+        remaining = _parseFloat(headers.get("X-RateLimit-Remaining"))
+        rateLimit = _parseFloat(headers.get("X-RateLimit-Limit"))
+        rateDelay = _parseFloat(headers.get("X-RateLimit-Delay"))
+
+        # Azure devops reports a delay when it has started slowing requests down, before rejecting them
+        throttled = statusCode in THROTTLE_STATUS_CODES or retryAfter is not None or (rateDelay or 0) > 0
+        nearLimit = remaining is not None and rateLimit and remaining < rateLimit * RATE_LIMIT_LOW_FRACTION
+
+        with self.condition:
+            now = time.monotonic()
+            if throttled or nearLimit:
+                if throttled:
+                    self.stats["throttled"] += 1
+                if now - self.lastDecrease >= DECREASE_INTERVAL:
+                    self.limit = max(float(self.minConcurrency), self.limit / 2)
+                    self.lastDecrease = now
+                    self.stats["decreases"] += 1
+                    logging.info(f"Azure DevOps is throttling, lowered the concurrency limit to {int(self.limit)}")
+            elif statusCode < 400:
+                self.limit = min(float(self.maxConcurrency), self.limit + 1 / self.limit)
+            if retryAfter is not None:
+                self.pausedUntil = max(self.pausedUntil, now + retryAfter)
+            self.condition.notify_all()
+        return retryAfter
+
+    def waitBeforeRetry(self, attempt, retryAfter=None):
+        """
+        Waits before retrying a failed request. When azure devops gave a delay every request is already paused
+        until it has passed, otherwise this sleeps with exponential backoff and jitter.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            retryAfter (float): The delay azure devops asked for, if any.
+        """
+        with self.condition:
+            self.stats["retries"] += 1
+        if retryAfter is None:
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            time.sleep(random.uniform(delay / 2, delay))
+
+
+# Parse a Retry-After header given either in seconds or as an HTTP date
+def parseRetryAfter(value):
+    if not value:
+        return None
+    seconds = _parseFloat(value)
+    if seconds is None:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(RETRY_MAX_DELAY, max(0.0, seconds))
+
+
+def _parseFloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
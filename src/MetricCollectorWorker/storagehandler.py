@@ -0,0 +1,394 @@
+from azure.data.tables import TableClient, TableTransactionError, UpdateMode
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceModifiedError, ServiceRequestError, ServiceResponseError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import logging
+import random
+import re
+import time
+from shared_code import clients
+from shared_code import telemetry
+from . import config
+
+# Maximum number of entities in a single table transaction
+TRANSACTION_SIZE = 100
+
+# Status codes of table operations that are retried
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# Build fields stored as datetimes in the time index table
+TIME_INDEX_DATETIME_FIELDS = ["queueTime", "startTime", "finishTime"]
+
+# Partition of the rows of the work item table, must match the query api
+WORK_ITEM_PARTITION_KEY = "workItem"
+
+# Format of the day partitions of the time index table, must match the query api
+TIME_INDEX_PARTITION_FORMAT = "%Y-%m-%d"
+
+# Build results counted separately in the rollups, any other result is counted as otherResults
+ROLLUP_RESULTS = ["succeeded", "partiallySucceeded", "failed", "canceled"]
+
+# Buckets of the run duration histogram in the rollups with their exclusive upper bound in seconds
+ROLLUP_RUN_HISTOGRAM = [
+    ("runUnder1m", 60),
+    ("runUnder5m", 300),
+    ("runUnder10m", 600),
+    ("runUnder30m", 1800),
+    ("runUnder1h", 3600),
+    ("runOver1h", None),
+]
+
+# Prefixes of the row keys of a rollup partition, which holds one row per day and one marker row per counted build
+ROLLUP_DAY_PREFIX = "day|"
+ROLLUP_BUILD_PREFIX = "build|"
+
+# Partition of the rollup table listing every rollup partition, so the query api can read them without a table scan
+ROLLUP_INDEX_PARTITION_KEY = "pipelines"
+
+# Maximum number of builds added to a rollup partition in one transaction, each build writes its marker and up to two day rows
+ROLLUP_TRANSACTION_BUILDS = 32
+
+# Status codes of a table transaction that failed because another writer changed one of its rows first
+CONFLICT_STATUS_CODES = (409, 412)
+
+# Rollup partitions known to be in the index, kept at module level so each is only indexed once per worker
+_indexed_rollup_partitions = set()
+
+# Base delay in seconds of the exponential backoff between retries
+RETRY_BASE_DELAY = 0.5
+
+def connect_to_table_service(table_name: str = None) -> TableClient:
+    """
+    Returns the shared Azure Table client of this worker.
+    Uses the configured storage table unless a table name is given.
+    """
+    return clients.get_table_client(config.storage_connection_string, table_name or config.storage_table_name)
+
+def store_dicts_in_table(data_list: list, table_name: str = None) -> dict:
+    """
+    Stores a list of dictionaries in an Azure Table using batch operations.
+    Rows are grouped into single partition transactions which are submitted concurrently,
+    throttled and transient failures are retried with backoff.
+    Returns the number of rows written, retried and failed.
+    """
+    # Group the rows by partition, a row key can only appear once in a transaction so the last one wins
+    partitions = {}
+    for data in data_list:
+        partitions.setdefault(data["PartitionKey"], {})[data["RowKey"]] = data
+
+    transactions = []
+    for rows in partitions.values():
+        rows = list(rows.values())
+        for i in range(0, len(rows), TRANSACTION_SIZE):
+            transactions.append([('upsert', data) for data in rows[i:i + TRANSACTION_SIZE]])
+
+    counts = {"written": 0, "retried": 0, "failed": 0}
+    if not transactions:
+        return counts
+    with ThreadPoolExecutor(max_workers=min(config.storage_writer_workers, len(transactions))) as executor:
+        for result in executor.map(telemetry.propagate(lambda operations: _submit_transaction(table_name, operations)), transactions):
+            for key in counts:
+                counts[key] += result[key]
+    logging.info(f"Stored rows in table: {counts}")
+    return counts
+
+def store_builds(build_list: list, work_items: dict = None) -> dict:
+    """
+    Stores build rows in the build table and in the time index table, and adds them to the daily rollups.
+    The work items of the builds, keyed by work item id, are stored once each in the work item table.
+    Returns the number of builds written, the rows retried and failed across the tables and the builds whose rollups failed.
+    Rollups are derived data that the next collection of the builds corrects, so their failures are not counted as failed rows.
+    """
+    counts = store_dicts_in_table(build_list)
+    index_counts = store_dicts_in_table([to_time_index_row(build) for build in build_list], config.time_index_table_name)
+    counts["retried"] += index_counts["retried"]
+    counts["failed"] += index_counts["failed"]
+    if work_items:
+        work_item_counts = store_dicts_in_table([to_work_item_row(work_item_id, work_item) for work_item_id, work_item in work_items.items()], config.work_item_table_name)
+        counts["retried"] += work_item_counts["retried"]
+        counts["failed"] += work_item_counts["failed"]
+    counts["rollupsFailed"] = update_rollups(build_list)["failed"]
+    return counts
+
+def update_rollups(build_list: list) -> dict:
+    """
+    Adds the builds to the daily rollups of their repository and pipeline.
+    Every rollup partition holds a marker row per counted build with what it added, so builds that are stored again are not counted twice
+    and builds that changed since, for example after a re-run, are moved to their new result, durations and day.
+    Partitions are updated concurrently, the builds of one partition in transactions of ROLLUP_TRANSACTION_BUILDS builds.
+    Returns the number of builds updated and failed.
+    """
+    partitions = {}
+    for build in build_list:
+        partitions.setdefault((build["PartitionKey"], build["pipelineName"]), {})[build["RowKey"]] = build
+
+    counts = {"updated": 0, "failed": 0}
+    if not partitions:
+        return counts
+    with ThreadPoolExecutor(max_workers=min(config.storage_writer_workers, len(partitions))) as executor:
+        for result in executor.map(telemetry.propagate(lambda item: _update_rollup_partition(*item[0], list(item[1].values()))), partitions.items()):
+            for key in counts:
+                counts[key] += result[key]
+    logging.info(f"Updated rollups: {counts}")
+    return counts
+
+def _update_rollup_partition(repository: str, pipeline_name: str, builds: list) -> dict:
+    partition_key = _table_key(repository + "|" + pipeline_name)
+    counts = {"updated": 0, "failed": 0}
+    try:
+        _index_rollup_partition(partition_key, repository, pipeline_name)
+    except Exception as e:
+        logging.info(f"Failed to index rollup partition {partition_key}: {e}")
+        counts["failed"] = len(builds)
+        return counts
+    for i in range(0, len(builds), ROLLUP_TRANSACTION_BUILDS):
+        chunk = builds[i:i + ROLLUP_TRANSACTION_BUILDS]
+        counts["updated" if _update_rollup(partition_key, repository, pipeline_name, chunk) else "failed"] += len(chunk)
+    return counts
+
+def _index_rollup_partition(partition_key: str, repository: str, pipeline_name: str):
+    if partition_key in _indexed_rollup_partitions:
+        return
+    upsert_entity(config.rollup_table_name, {"PartitionKey": ROLLUP_INDEX_PARTITION_KEY, "RowKey": partition_key, "repository": repository, "pipelineName": pipeline_name})
+    _indexed_rollup_partitions.add(partition_key)
+
+def _update_rollup(partition_key: str, repository: str, pipeline_name: str, builds: list) -> bool:
+    """
+    Applies the builds to the day rows of a rollup partition in a single transaction with optimistic concurrency,
+    retrying when another writer changed one of the rows first.
+    """
+    # Markers are only read once a transaction found that one exists, so builds collected for the first time cost one transaction
+    read_markers = False
+    for attempt in range(config.storage_max_retries + 1):
+        markers = _get_rollup_markers(partition_key, builds) if read_markers else {}
+        changes = []
+        for build in builds:
+            marker = markers.get(build["RowKey"])
+            previous = _marker_contribution(marker) if marker is not None else None
+            contribution = _rollup_contribution(build)
+            if contribution != previous:
+                changes.append((build, marker, previous, contribution))
+        if not changes:
+            return True
+
+        days = {change["day"] for _, _, previous, contribution in changes for change in (previous, contribution) if change}
+        existing_days = {day: get_entity(config.rollup_table_name, partition_key, ROLLUP_DAY_PREFIX + day) for day in days}
+        rollups = {day: dict(existing) if existing is not None else _new_rollup(partition_key, repository, pipeline_name, day) for day, existing in existing_days.items()}
+
+        operations = []
+        for build, marker, previous, contribution in changes:
+            if previous:
+                _apply_contribution(rollups[previous["day"]], previous, -1)
+            if contribution:
+                _apply_contribution(rollups[contribution["day"]], contribution, 1)
+            operations.append(_conditional_write({"PartitionKey": partition_key, "RowKey": ROLLUP_BUILD_PREFIX + build["RowKey"], **(contribution or {})}, marker))
+        for day, rollup in rollups.items():
+            operations.append(_conditional_write(rollup, existing_days[day]))
+
+        try:
+            with telemetry.span("table.transaction", table=config.rollup_table_name, entities=len(operations)):
+                connect_to_table_service(config.rollup_table_name).submit_transaction(operations)
+            return True
+        except (TableTransactionError, ResourceExistsError, ResourceModifiedError) as e:
+            if isinstance(e, TableTransactionError) and e.status_code not in CONFLICT_STATUS_CODES:
+                logging.info(f"Failed to update rollups of {partition_key}: {e}")
+                return False
+            logging.info(f"Rollups of {partition_key} changed while updating them, retrying")
+            read_markers = True
+        except Exception as e:
+            logging.info(f"Failed to update rollups of {partition_key}: {e}")
+            return False
+    return False
+
+def _get_rollup_markers(partition_key: str, builds: list) -> dict:
+    # Read the markers of the builds concurrently, keyed by the row key of the build
+    with ThreadPoolExecutor(max_workers=min(config.storage_writer_workers, len(builds))) as executor:
+        markers = executor.map(lambda build: get_entity(config.rollup_table_name, partition_key, ROLLUP_BUILD_PREFIX + build["RowKey"]), builds)
+        return {build["RowKey"]: marker for build, marker in zip(builds, markers) if marker is not None}
+
+def _rollup_contribution(build: dict) -> dict:
+    """
+    Returns what a build adds to its day rollup, which is also stored in its marker row, or None if it has no finish time.
+    """
+    queue_time = parse_devops_datetime(build.get("queueTime"))
+    start_time = parse_devops_datetime(build.get("startTime"))
+    finish_time = parse_devops_datetime(build.get("finishTime"))
+    if finish_time is None:
+        return None
+    contribution = {
+        "day": finish_time.strftime(TIME_INDEX_PARTITION_FORMAT),
+        "result": build.get("result") if build.get("result") in ROLLUP_RESULTS else "otherResults",
+    }
+    if queue_time and start_time:
+        contribution["queueSeconds"] = (start_time - queue_time).total_seconds()
+    if start_time:
+        run_seconds = (finish_time - start_time).total_seconds()
+        contribution["runSeconds"] = run_seconds
+        contribution["runBucket"] = next(bucket for bucket, upper_bound in ROLLUP_RUN_HISTOGRAM if upper_bound is None or run_seconds < upper_bound)
+    # Table storage does not store empty properties, so leave them out to compare with the marker
+    if build.get("requestedFor"):
+        contribution["requestedFor"] = build["requestedFor"]
+    return contribution
+
+def _marker_contribution(marker: dict) -> dict:
+    contribution = {key: value for key, value in marker.items() if key not in ("PartitionKey", "RowKey", "Timestamp")}
+    return contribution or None
+
+def _new_rollup(partition_key: str, repository: str, pipeline_name: str, day: str) -> dict:
+    return {
+        "PartitionKey": partition_key,
+        "RowKey": ROLLUP_DAY_PREFIX + day,
+        "repository": repository,
+        "pipelineName": pipeline_name,
+        "day": day,
+        "builds": 0,
+        "runSecondsSum": 0.0,
+        "queueSecondsSum": 0.0,
+        "contributors": "{}",
+        "distinctContributors": 0,
+        **{result: 0 for result in ROLLUP_RESULTS + ["otherResults"]},
+        **{bucket: 0 for bucket, _ in ROLLUP_RUN_HISTOGRAM},
+    }
+
+def _apply_contribution(rollup: dict, contribution: dict, sign: int):
+    # Adds the contribution of a build to a day rollup, or removes it with a sign of -1
+    rollup["builds"] += sign
+    rollup[contribution["result"]] += sign
+    rollup["queueSecondsSum"] += sign * contribution.get("queueSeconds", 0.0)
+    rollup["runSecondsSum"] += sign * contribution.get("runSeconds", 0.0)
+    if "runBucket" in contribution:
+        rollup[contribution["runBucket"]] += sign
+    if "requestedFor" in contribution:
+        # Contributors are kept with their number of builds, bounded by the people building the pipeline rather than the builds
+        contributors = json.loads(rollup["contributors"])
+        contributors[contribution["requestedFor"]] = contributors.get(contribution["requestedFor"], 0) + sign
+        if contributors[contribution["requestedFor"]] <= 0:
+            del contributors[contribution["requestedFor"]]
+        rollup["contributors"] = json.dumps(contributors, sort_keys=True)
+        rollup["distinctContributors"] = len(contributors)
+
+def _conditional_write(row: dict, existing) -> tuple:
+    # Creating fails if another writer created the row first, replacing fails if another writer changed it since it was read
+    if existing is None:
+        return ("create", row)
+    return ("update", row, {"mode": UpdateMode.REPLACE, "etag": existing.metadata["etag"], "match_condition": MatchConditions.IfNotModified})
+
+def _table_key(value: str) -> str:
+    # Table keys cannot contain these characters
+    return re.sub(r"[/\\#?\x00-\x1f\x7f]", "_", value)
+
+def to_time_index_row(build: dict) -> dict:
+    """
+    Returns the time index row of a build row, partitioned by the UTC day the build finished and with typed datetimes.
+    """
+    row = dict(build)
+    for key in TIME_INDEX_DATETIME_FIELDS:
+        row[key] = parse_devops_datetime(build.get(key))
+    row["repository"] = build["PartitionKey"]
+    row["PartitionKey"] = row["finishTime"].strftime(TIME_INDEX_PARTITION_FORMAT)
+    row["RowKey"] = build["PartitionKey"] + "|" + build["RowKey"]
+    return row
+
+def to_work_item_row(work_item_id: str, work_item: dict) -> dict:
+    """
+    Returns the work item table row of a work item, all work items share one partition so they are written in batches.
+    """
+    row = {"PartitionKey": WORK_ITEM_PARTITION_KEY, "RowKey": str(work_item_id)}
+    # Table storage does not store null properties, so leave them out
+    row.update({key: value for key, value in work_item.items() if value is not None})
+    return row
+
+def parse_devops_datetime(value: str) -> datetime:
+    """
+    Parses a datetime string from azure devops such as 2023-05-01T12:34:56.1234567Z into a UTC datetime.
+    """
+    if not value:
+        return None
+    # Azure devops sends up to 7 fractional digits while datetime only parses exactly 6
+    value = re.sub(r"\.(\d+)", lambda match: "." + match.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"))
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def _submit_transaction(table_name: str, operations: list) -> dict:
+    """
+    Submits a single partition transaction, retrying throttled and transient failures with exponential backoff.
+    """
+    retried = 0
+    for attempt in range(config.storage_max_retries + 1):
+        try:
+            with telemetry.span("table.transaction", table=table_name or config.storage_table_name, entities=len(operations)):
+                connect_to_table_service(table_name).submit_transaction(operations)
+            return {"written": len(operations), "retried": retried, "failed": 0}
+        except Exception as e:
+            if not _is_transient(e) or attempt == config.storage_max_retries:
+                logging.info(f"Failed to store {len(operations)} rows in partition {operations[0][1]['PartitionKey']}: {e}")
+                return {"written": 0, "retried": retried, "failed": len(operations)}
+            retried += len(operations)
+            # Reconnect before retrying when the connection itself failed
+            if isinstance(e, ServiceRequestError):
+                clients.reset_table_client(config.storage_connection_string, table_name or config.storage_table_name)
+            delay = RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, RETRY_BASE_DELAY)
+            logging.info(f"Transient failure storing rows, retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Returns whether a table operation failure is worth retrying.
+    """
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    return isinstance(error, HttpResponseError) and error.status_code in TRANSIENT_STATUS_CODES
+
+def get_entity(table_name: str, partition_key: str, row_key: str):
+    """
+    Reads a single entity from the given table, returns None if it does not exist.
+    """
+    try:
+        return clients.call_table(config.storage_connection_string, table_name, lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key))
+    except Exception as e:
+        logging.debug(f"Unable to read {partition_key}/{row_key} from {table_name}: {e}")
+        return None
+
+def upsert_entity(table_name: str, entity: dict):
+    """
+    Upserts a single entity into the given table.
+    """
+    clients.call_table(config.storage_connection_string, table_name, lambda table_client: table_client.upsert_entity(entity))
+
+def get_watermark(repository_id: str):
+    """
+    Returns the finish time of the newest build collected for the repository, or None if it has not been collected yet.
+    """
+    entity = get_entity(config.watermark_table_name, "watermark", repository_id)
+    if entity is None:
+        return None
+    return entity.get("finishTime")
+
+def set_watermark(repository_id: str, finish_time: str, build_id: int):
+    """
+    Stores the finish time and id of the newest build collected for the repository.
+    """
+    upsert_entity(config.watermark_table_name, {
+        "PartitionKey": "watermark",
+        "RowKey": repository_id,
+        "finishTime": finish_time,
+        "buildId": build_id,
+    })
+
+def get_checkpoint(repository_id: str):
+    """
+    Returns the backfill checkpoint of the repository, or None if it has not been backfilled yet.
+    """
+    return get_entity(config.backfill_table_name, "checkpoint", repository_id)
+
+def set_checkpoint(repository_id: str, checkpoint: dict):
+    """
+    Replaces the backfill checkpoint of the repository, so fields left out of the checkpoint such as a finished continuation token are removed.
+    """
+    entity = {"PartitionKey": "checkpoint", "RowKey": repository_id, "updatedAt": datetime.now(timezone.utc).isoformat()}
+    entity.update({key: value for key, value in checkpoint.items() if value is not None})
+    clients.call_table(config.storage_connection_string, config.backfill_table_name, lambda table_client: table_client.upsert_entity(entity, mode=UpdateMode.REPLACE))
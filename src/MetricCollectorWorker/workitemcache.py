@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime, timezone
+from shared_code.ttlcache import TtlLruCache
+from . import config
+from . import storagehandler
+
+# The cache lives at module level so it stays warm across invocations on the same worker
+_cache = TtlLruCache(config.work_item_cache_size, config.work_item_cache_ttl)
+_lock = threading.Lock()
+
+# Hit/miss counters across memory and the work item table, cumulative for the lifetime of the worker
+stats = {"hits": 0, "misses": 0, "tableHits": 0}
+
+# Fields of the work item info that are cached
+WORK_ITEM_FIELDS = ["title", "workItemType", "parentWorkItemId", "parentWorkItemTitle"]
+
+# Field of the work item info holding when it was read from azure devops, stored with the work item in the work item table
+UPDATED_AT_FIELD = "updatedAt"
+
+
+def get(workItemId):
+    """
+    Returns the cached work item info for the given ID, or None if it is not cached or has expired.
+    Falls back to the work item table the collector stores work items in, so workers share what any of them has read.
+
+    Args:
+        workItemId (str): The ID of the work item.
+
+    Returns:
+        dict: The cached work item info, or None.
+    """
+    workItemInfo = _cache.get(workItemId)
+    if workItemInfo is not None:
+        with _lock:
+            stats["hits"] += 1
+        return workItemInfo
+
+    workItemInfo = _getFromTable(workItemId)
+    if workItemInfo is not None:
+        with _lock:
+            stats["hits"] += 1
+            stats["tableHits"] += 1
+        _cache.put(workItemId, workItemInfo)
+        return workItemInfo
+
+    with _lock:
+        stats["misses"] += 1
+    return None
+
+
+def put(workItemId, workItemInfo):
+    """
+    Stores work item info read from azure devops in the in-process cache, stamped with the time it was read.
+    The work item table is written with the builds that reference the work item, and keeps the stamp as its age.
+
+    Args:
+        workItemId (str): The ID of the work item.
+        workItemInfo (dict): The work item info to cache.
+    """
+    workItemInfo[UPDATED_AT_FIELD] = workItemInfo.get(UPDATED_AT_FIELD) or datetime.now(timezone.utc).isoformat()
+    _cache.put(workItemId, workItemInfo)
+
+
+def clear():
+    """
+    Empties the in-process cache and resets the counters.
+    """
+    _cache.clear()
+    with _lock:
+        for key in stats:
+            stats[key] = 0
+
+
+def _getFromTable(workItemId):
+    entity = storagehandler.get_entity(config.work_item_table_name, storagehandler.WORK_ITEM_PARTITION_KEY, str(workItemId))
+    if entity is None or not entity.get(UPDATED_AT_FIELD):
+        return None
+    # Work items read longer ago than the TTL are treated as missing so they get refreshed from azure devops
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(entity[UPDATED_AT_FIELD])
+    if age.total_seconds() > config.work_item_cache_ttl:
+        return None
+    return {field: entity.get(field) for field in WORK_ITEM_FIELDS + [UPDATED_AT_FIELD]}
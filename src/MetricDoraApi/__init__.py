@@ -0,0 +1,56 @@
+import azure.functions as func
+from shared_code import metricsengine
+from shared_code import querycache
+from shared_code import telemetry
+from shared_code import timeindex
+import json
+from . import requesthandler
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Azure Function entry point. Records the stages of the invocation and logs one summary when it ends.
+    """
+    with telemetry.invocation("MetricDoraApi"):
+        return handle_request(req)
+
+
+def handle_request(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Computes build and DORA metrics for the requested timerange without calling openai.
+
+    Args:
+        req (func.HttpRequest): The incoming HTTP request with a JSON body containing "fromDateTime" and optionally "groupBy".
+
+    Returns:
+        func.HttpResponse: If the request is invalid, returns a 400 response. Otherwise, returns a 200 response with the metrics as JSON.
+    """
+
+    # Get the request and validate it against request handler returning 400 if incorrect
+    try:
+        parsedValues = requesthandler.parse_request(req.get_json())
+        fromDateTime = timeindex.parse_datetime(parsedValues["fromDateTime"])
+    except Exception as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    # Query the builds of the timerange through the shared query cache
+    try:
+        data = querycache.get_entities(fromDateTime)
+    except Exception as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    # Compute the metrics over the whole requested period
+    groupBy = parsedValues.get("groupBy", "pipelineName")
+    periodDays = metricsengine.get_period_days(fromDateTime)
+    try:
+        metrics = metricsengine.compute_metrics(data, groupBy, periodDays)
+    except Exception as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    response = {
+        "fromDateTime": fromDateTime.isoformat(),
+        "groupBy": groupBy,
+        "builds": len(data),
+        "metrics": metrics,
+    }
+    return func.HttpResponse(json.dumps(response), status_code=200, mimetype="application/json")
@@ -0,0 +1,26 @@
+import logging
+
+# The JSON payload that is sent to the webhook must be in the correct format for the webhook to be able to parse it.
+# The JSON payload must contain the following fields and types
+# {
+#   "fromDateTime": datetime,
+# }
+# Optionally "groupBy": "repository", "pipelineName", "requestedFor" or "workItemId" can be sent, metrics are grouped by pipeline by default
+
+
+# Create def to parse the JSON payload, check correct types and return the values
+def parse_request(req):
+    parsedValues = {}
+    try:
+        for key in req.keys():
+            if key in req:
+                if isinstance(req[key], str):
+                    parsedValues[key] = req[key]
+                else:
+                    logging.info(f"Incorrect type for {key} in request")
+    except:
+        raise ValueError(f"Request was not formatted correctly")
+    if "fromDateTime" not in parsedValues:
+        raise ValueError("Request must contain a fromDateTime")
+    logging.info(parsedValues)
+    return parsedValues
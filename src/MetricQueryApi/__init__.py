@@ -1,12 +1,26 @@
 import azure.functions as func
+from shared_code import metricsengine
+from shared_code import querycache
+from shared_code import telemetry
+from shared_code import timeindex
 from . import requesthandler
 from . import storagehandler
 from . import openaihandler
+from . import answercache
+from . import workitems
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
-    Azure Function entry point. Parses the incoming HTTP request and returns a response.
+    Azure Function entry point. Records the stages of the invocation and logs one summary when it ends.
+    """
+    with telemetry.invocation("MetricQueryApi"):
+        return handle_request(req)
+
+
+def handle_request(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Parses the incoming HTTP request and returns a response.
 
     Args:
         req (func.HttpRequest): The incoming HTTP request with a JSON body.
@@ -21,16 +35,34 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         return func.HttpResponse(str(e), status_code=400)
 
-    # Try to query the table using the requested timerange
+    # Try to query the table using the requested timerange, follow-up questions are served from the query cache
+    # Trend questions can be answered from the daily rollups instead of the builds
+    source = parsedValues.get("source", "builds")
     try:
-        data = storagehandler.query_table_using_time(parsedValues["fromDateTime"])
+        if source == "rollups":
+            data = storagehandler.query_rollups(parsedValues["fromDateTime"])
+        else:
+            data = querycache.get_entities(parsedValues["fromDateTime"])
     except Exception as e:
         return func.HttpResponse(str(e), status_code=400)
-    
+
+    # Reuse the answer to the same question about the same data when it is cached
+    # The work items joined onto the builds are part of the data, so a re-titled work item gets a new answer
+    mode = parsedValues.get("mode")
+    includeMetrics = parsedValues.get("includeMetrics", False)
+    joinedWorkItems = workitems.get_referenced_work_items(data) if source != "rollups" else {}
+    cacheKey = answercache.make_key(parsedValues["message"], data, {"mode": mode, "includeMetrics": includeMetrics, "source": source, "fromDateTime": str(parsedValues["fromDateTime"])}, joinedWorkItems)
+    response = answercache.get(cacheKey)
+    if response is not None:
+        return func.HttpResponse(response, status_code=200)
+
     try:
-        response = openaihandler.get_openai_response(data, parsedValues["message"])
+        # Metrics cover the whole requested period, the same as the DORA endpoint
+        periodDays = metricsengine.get_period_days(timeindex.parse_datetime(parsedValues["fromDateTime"]))
+        response = openaihandler.get_openai_response(data, parsedValues["message"], mode, includeMetrics, source, periodDays)
     except Exception as e:
         return func.HttpResponse(str(e), status_code=400)
+    answercache.put(cacheKey, response)
 
 
     return func.HttpResponse(response, status_code=200)
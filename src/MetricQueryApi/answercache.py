@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from shared_code.ttlcache import TtlLruCache
+from . import config
+from . import openaihandler
+from . import promptencoder
+from . import storagehandler
+
+# Answers are kept at module level so they stay warm across invocations on the same worker
+_cache = TtlLruCache(config.answer_cache_size, config.answer_cache_ttl)
+
+# Partition used for answers persisted in the cache table
+TABLE_PARTITION_KEY = "answer"
+
+# Table storage string properties hold at most 32K characters, longer answers are only cached in memory
+MAX_TABLE_ANSWER_LENGTH = 32000
+
+# Fingerprint of everything that shapes the prompt, so changing a prompt or the encoding invalidates cached answers
+PROMPT_FINGERPRINT = hashlib.sha256("\n".join([
+    openaihandler.SYSTEM_PROMPT,
+    openaihandler.MAP_PROMPT,
+    openaihandler.REDUCE_PROMPT,
+    openaihandler.COMBINE_PROMPT,
+    openaihandler.ROLLUP_PROMPT,
+    promptencoder.FORMAT_DESCRIPTION,
+    ",".join(promptencoder.PROMPT_COLUMNS),
+    ",".join(promptencoder.ROLLUP_COLUMNS),
+]).encode("utf-8")).hexdigest()
+
+def normalize_message(message: str) -> str:
+    """
+    Normalizes a question so that differences in case, whitespace and trailing punctuation share an answer.
+    """
+    return re.sub(r"\s+", " ", message).strip().rstrip("?.!").lower()
+
+def fingerprint_entities(entities: list) -> str:
+    """
+    Returns a content hash of the entity set, based on the key and etag of every entity.
+    """
+    digest = hashlib.sha256()
+    for key in sorted(_entity_key(entity) for entity in entities):
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def fingerprint_work_items(work_items: dict) -> str:
+    """
+    Returns a content hash of the work items joined onto the entities, based on the id and etag of every work item.
+    """
+    digest = hashlib.sha256()
+    for work_item_id in sorted(work_items, key=str):
+        digest.update(f"{work_item_id}|{work_items[work_item_id].get('etag') or ''}".encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def make_key(message: str, entities: list, options: dict = None, work_items: dict = None) -> str:
+    """
+    Returns the cache key of an answer to the message about the entities and the work items joined onto them,
+    with the request options that change the answer.
+    """
+    parts = [
+        normalize_message(message),
+        fingerprint_entities(entities),
+        fingerprint_work_items(work_items or {}),
+        PROMPT_FINGERPRINT,
+        json.dumps(options or {}, sort_keys=True),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def get(key: str) -> str:
+    """
+    Returns the cached answer for the key, falling back to the cache table when one is configured, or None.
+    """
+    answer = _cache.get(key)
+    if answer is None:
+        answer = _get_from_table(key)
+        if answer is not None:
+            _cache.put(key, answer)
+    logging.info(f"Answer cache {'hit' if answer is not None else 'miss'}, stats: {_cache.stats}")
+    return answer
+
+def put(key: str, answer: str):
+    """
+    Caches the answer for the key, and in the cache table when one is configured.
+    """
+    _cache.put(key, answer)
+    _put_in_table(key, answer)
+
+def _entity_key(entity) -> str:
+    metadata = getattr(entity, "metadata", None) or {}
+    return f"{entity.get('PartitionKey')}|{entity.get('RowKey')}|{metadata.get('etag', '')}"
+
+def _get_from_table(key: str):
+    if not config.answer_cache_table_name:
+        return None
+    entity = storagehandler.get_entity(config.answer_cache_table_name, TABLE_PARTITION_KEY, key)
+    if entity is None or time.time() - entity.get("cachedAt", 0) > config.answer_cache_ttl:
+        return None
+    return entity.get("answer")
+
+def _put_in_table(key: str, answer: str):
+    if not config.answer_cache_table_name or len(answer) > MAX_TABLE_ANSWER_LENGTH:
+        return
+    try:
+        storagehandler.upsert_entity(config.answer_cache_table_name, {
+            "PartitionKey": TABLE_PARTITION_KEY,
+            "RowKey": key,
+            "answer": answer,
+            "cachedAt": time.time(),
+        })
+    except Exception as e:
+        logging.info(f"Unable to persist answer to cache table: {e}")
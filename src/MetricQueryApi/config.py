@@ -25,6 +25,40 @@ try:
     # Get project identifier used to get the work item from branches
     project_identifier = os.environ.get("PROJECT_IDENTIFIER")
 
+    # Table holding daily rollups of builds per repository and pipeline, written by the collector
+    rollup_table_name = os.environ.get("ROLLUP_TABLE_NAME", "buildrollups")
+
+    # Table holding the attributes of every work item referenced by a build, written by the collector
+    work_item_table_name = os.environ.get("WORK_ITEM_TABLE_NAME", "workitems")
+
+    # Maximum number of work items held in the in-process work item cache, and the seconds a cached work item is considered fresh
+    work_item_cache_size = int(os.environ.get("WORK_ITEM_CACHE_SIZE", "4096"))
+    work_item_cache_ttl = int(os.environ.get("WORK_ITEM_CACHE_TTL_SECONDS", "3600"))
+
+    # Number of partitions and work items read from the tables concurrently
+    query_workers = int(os.environ.get("QUERY_WORKERS", "8"))
+
+    # Maximum number of tokens of build data sent to openai in a single prompt
+    prompt_token_budget = int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000"))
+
+    # Tokenizer encoding used to count prompt tokens locally
+    prompt_tokenizer_encoding = os.environ.get("PROMPT_TOKENIZER_ENCODING", "cl100k_base")
+
+    # Number of concurrent openai calls when answering over chunks of data
+    openai_max_workers = int(os.environ.get("OPENAI_MAX_WORKERS", "4"))
+
+    # Number of times a rate limited or transient openai failure is retried
+    openai_max_retries = int(os.environ.get("OPENAI_MAX_RETRIES", "5"))
+
+    # Maximum number of answers held in the in-process answer cache
+    answer_cache_size = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+
+    # Number of seconds a cached answer is reused
+    answer_cache_ttl = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+    # Optional table used to share cached answers between instances, disabled when not set
+    answer_cache_table_name = os.environ.get("ANSWER_CACHE_TABLE_NAME")
+
     # Get the openai endpoint from the environment variables and store it in the openai_api_base variable
     openai_api_base = os.environ.get("AZURE_OPENAI_ENDPOINT")
 
@@ -1,33 +1,217 @@
 import openai
 import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shared_code import clients
+from shared_code import metricsengine
+from shared_code import telemetry
 from . import config
+from . import promptencoder
+from . import workitems
 
 
 def set_openai_api():
     """
-    Sets the openai client with the api key and api type.
+    Sets the openai client with the api key and api type, once per worker.
     """
-    openai.api_key = config.openai_api_key
-    openai.api_base = config.openai_api_base
-    openai.api_type = "azure"
-    openai.api_version = "2023-05-15"
+    clients.get_openai_client(config.openai_api_key, config.openai_api_base, "azure", "2023-05-15")
 
-import json
+SYSTEM_PROMPT = "You are going to be sent a subset of build data from Azure DevOps pipelines, the user will be expecting you to answer questions about this data."
 
-def get_openai_response(data: list, message: str):
+MAP_PROMPT = (
+    "You are going to be sent part {part} of {parts} of a set of build data from Azure DevOps pipelines. "
+    "Answer the user's question using only this part. Your answer will be combined with the answers for the other parts, "
+    "so give complete intermediate results such as counts, totals, durations and lists rather than percentages or rankings, and say nothing about data you were not sent."
+)
+
+REDUCE_PROMPT = (
+    "The build data from Azure DevOps pipelines was too large to send at once, so the user's question was answered for each part of it separately. "
+    "You are going to be sent those partial answers. Combine them into a single answer to the user's question as if you had seen all of the data."
+)
+
+COMBINE_PROMPT = (
+    "The build data from Azure DevOps pipelines was too large to send at once, so the user's question was answered for each part of it separately. "
+    "You are going to be sent some of those partial answers. Combine them into a single partial answer, it will be combined with the answers for the other parts, "
+    "so give complete intermediate results such as counts, totals, durations and lists rather than percentages or rankings."
+)
+
+ROLLUP_PROMPT = (
+    "You are going to be sent daily rollups of build data from Azure DevOps pipelines, one row per repository, pipeline and day, "
+    "with build counts by result, duration totals, a run duration histogram and the number of distinct contributors. "
+    "The user will be expecting you to answer questions about this data."
+)
+
+def get_openai_response(data: list, message: str, mode: str = None, include_metrics: bool = False, source: str = "builds", period_days: float = None):
+    """
+    Answers the message about the build data using openai.
+    In "mapreduce" mode, or when the data does not fit the token budget and no mode is given,
+    the data is split into chunks that are answered separately and then combined.
+    With include_metrics, metrics computed per pipeline over period_days are sent as additional context.
+    With the "rollups" source the data is daily rollups rather than builds.
+    """
     set_openai_api()
-    deployment_name = config.openai_deployment_name
-
-    try:
-        response = openai.ChatCompletion.create(
-            engine=deployment_name,
-            messages=[
-                {"role": "system", "content": "You are going to be sent a subset of build data as a JSON formatted list from Azure DevOps pipelines, the user will be expecting you to answer questions about this data."},
-                {"role": "system", "content": json.dumps(data)},
-                {"role": "user", "content": message},
-            ])
-        
-        logging.info(f"OpenAI response: {response}")
+    messages, _ = build_messages(data, message, mode, include_metrics, source, period_days)
+    response = create_chat_completion(messages)
+    return response['choices'][0]['message']['content']
+
+def build_messages(data: list, message: str, mode: str = None, include_metrics: bool = False, source: str = "builds", period_days: float = None):
+    """
+    Builds the messages sent to openai to answer the message about the data.
+    Returns the messages and the encoding of the data.
+    """
+    if source == "rollups":
+        encoded = promptencoder.encode_entities(data, columns=promptencoder.ROLLUP_COLUMNS)
+        logging.info(f"Prompt data: {encoded['tokens']} tokens, {encoded['rows']} of {encoded['totalRows']} rollups")
+        return [
+            {"role": "system", "content": ROLLUP_PROMPT},
+            {"role": "system", "content": encoded["text"]},
+            {"role": "user", "content": message},
+        ], encoded
+
+    # Builds only carry the id of their work item, add the work item attributes for the prompt
+    data = workitems.join_work_items(data)
+
+    # Encode the build data compactly so it fits the token budget
+    encoded = promptencoder.encode_entities(data)
+    logging.info(f"Prompt data: {encoded['tokens']} tokens, {encoded['rows']} of {encoded['totalRows']} rows")
+
+    if mode == "mapreduce" or (mode is None and encoded["rows"] < encoded["totalRows"]):
+        messages = get_map_reduce_messages(data, message)
+    else:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": encoded["text"]},
+            {"role": "user", "content": message},
+        ]
+    if include_metrics:
+        messages = add_metrics_context(messages, data, period_days)
+    return messages, encoded
+
+def get_map_reduce_messages(data: list, message: str) -> list:
+    """
+    Answers the message for each chunk of the data concurrently and returns the messages of the final call that combines the partial answers.
+    Partial answers that do not fit the token budget together are combined in batches first, level by level, until they do.
+    """
+    chunks = chunk_entities(data, config.prompt_token_budget)
+    logging.info(f"Answering over {len(chunks)} chunks of {len(data)} entities")
+
+    def map_chunk(indexed_chunk):
+        index, chunk = indexed_chunk
+        response = create_chat_completion([
+            {"role": "system", "content": MAP_PROMPT.format(part=index + 1, parts=len(chunks))},
+            {"role": "system", "content": promptencoder.encode_entities(chunk)["text"]},
+            {"role": "user", "content": message},
+        ])
+        return response['choices'][0]['message']['content']
+
+    def combine_batch(batch):
+        response = create_chat_completion([
+            {"role": "system", "content": COMBINE_PROMPT},
+            {"role": "system", "content": _format_answers(batch)},
+            {"role": "user", "content": message},
+        ])
         return response['choices'][0]['message']['content']
-    except Exception as e:
-        raise ValueError(f"Unable to get OpenAI response: {e}")
\ No newline at end of file
+
+    with ThreadPoolExecutor(max_workers=max(1, min(config.openai_max_workers, len(chunks)))) as executor:
+        partial_answers = list(executor.map(telemetry.propagate(map_chunk), enumerate(chunks)))
+        while len(partial_answers) > 1 and promptencoder.count_tokens(_format_answers(partial_answers)) > config.prompt_token_budget:
+            batches = _batch_answers(partial_answers, config.prompt_token_budget)
+            logging.info(f"Combining {len(partial_answers)} partial answers in {len(batches)} batches")
+            partial_answers = list(executor.map(telemetry.propagate(combine_batch), batches))
+
+    return [
+        {"role": "system", "content": REDUCE_PROMPT},
+        {"role": "system", "content": _format_answers(partial_answers)},
+        {"role": "user", "content": message},
+    ]
+
+def add_metrics_context(messages: list, data: list, period_days: float = None) -> list:
+    """
+    Adds the metrics of the build data, computed per pipeline over the period, as a system message ahead of the user's question.
+    """
+    metrics = metricsengine.compute_metrics(data, "pipelineName", period_days)
+    return messages[:-1] + [{"role": "system", "content": metricsengine.format_metrics_for_prompt(metrics)}] + messages[-1:]
+
+def chunk_entities(entities: list, token_budget: int) -> list:
+    """
+    Splits the entities into chunks whose encoded size fits the token budget.
+    Entities are grouped by repository, repositories that do not fit are split into time slices,
+    and neighbouring groups are packed together while they still fit.
+    """
+    repositories = {}
+    for entity in sorted(entities, key=lambda entity: str(entity.get("finishTime"))):
+        repositories.setdefault(entity.get("repository"), []).append(entity)
+
+    pieces = []
+    for rows in repositories.values():
+        pieces.extend(_split_to_fit(rows, token_budget))
+
+    chunks = []
+    for piece in pieces:
+        if chunks and _fits(chunks[-1] + piece, token_budget):
+            chunks[-1] = chunks[-1] + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def create_chat_completion(messages: list):
+    """
+    Sends the messages to the openai deployment, retrying rate limited and transient failures with backoff.
+    """
+    for attempt in range(config.openai_max_retries + 1):
+        try:
+            with telemetry.span("openai.completion") as attributes:
+                response = openai.ChatCompletion.create(engine=config.openai_deployment_name, messages=messages)
+                usage = response.get("usage") or {}
+                attributes["promptTokens"] = usage.get("prompt_tokens", 0)
+                attributes["completionTokens"] = usage.get("completion_tokens", 0)
+            logging.info(f"OpenAI response: {response}")
+            logging.info(f"OpenAI token usage: {response.get('usage')}")
+            return response
+        except (openai.error.RateLimitError, openai.error.ServiceUnavailableError, openai.error.Timeout, openai.error.APIConnectionError) as e:
+            if attempt == config.openai_max_retries:
+                raise ValueError(f"Unable to get OpenAI response: {e}")
+            delay = _retry_delay(e, attempt)
+            logging.info(f"OpenAI request throttled or failed, retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+        except Exception as e:
+            raise ValueError(f"Unable to get OpenAI response: {e}")
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # Prefer the delay the service asked for, otherwise back off exponentially with jitter
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return 2 ** attempt + random.uniform(0, 1)
+
+def _format_answers(answers: list) -> str:
+    return "\n\n".join(f"Answer for part {index + 1}:\n{answer}" for index, answer in enumerate(answers))
+
+def _batch_answers(answers: list, token_budget: int) -> list:
+    # Pack neighbouring answers while they fit the budget, every batch takes at least two answers so each level shrinks
+    batches = []
+    batch_tokens = 0
+    for answer in answers:
+        tokens = promptencoder.count_tokens(answer)
+        if batches and (len(batches[-1]) < 2 or batch_tokens + tokens <= token_budget):
+            batches[-1].append(answer)
+            batch_tokens += tokens
+        else:
+            batches.append([answer])
+            batch_tokens = tokens
+    return batches
+
+def _fits(rows: list, token_budget: int) -> bool:
+    return promptencoder.count_entity_tokens(rows) <= token_budget
+
+def _split_to_fit(rows: list, token_budget: int) -> list:
+    # Halve the time slice until each half fits, a single row is always kept as its own slice
+    if len(rows) <= 1 or _fits(rows, token_budget):
+        return [rows]
+    middle = len(rows) // 2
+    return _split_to_fit(rows[:middle], token_budget) + _split_to_fit(rows[middle:], token_budget)
@@ -0,0 +1,168 @@
+import csv
+import io
+import logging
+from datetime import datetime
+from . import config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Columns sent to the model, in the order they appear in the prompt
+PROMPT_COLUMNS = [
+    "repository",
+    "pipelineName",
+    "result",
+    "buildReason",
+    "queueTime",
+    "startTime",
+    "finishTime",
+    "requestedFor",
+    "sourceBranch",
+    "workItemId",
+    "workItemType",
+    "title",
+    "parentWorkItemId",
+    "parentWorkItemTitle",
+    "ciMessage",
+]
+
+# Columns of the daily rollups sent to the model
+ROLLUP_COLUMNS = [
+    "repository",
+    "pipelineName",
+    "day",
+    "builds",
+    "succeeded",
+    "partiallySucceeded",
+    "failed",
+    "canceled",
+    "otherResults",
+    "meanQueueSeconds",
+    "meanRunSeconds",
+    "runUnder1m",
+    "runUnder5m",
+    "runUnder10m",
+    "runUnder30m",
+    "runUnder1h",
+    "runOver1h",
+    "distinctContributors",
+]
+
+# Columns with repeated values that are replaced by short codes, with the prefix of their codes
+DICTIONARY_COLUMNS = {
+    "repository": "R",
+    "pipelineName": "P",
+    "requestedFor": "U",
+    "sourceBranch": "B",
+    "title": "W",
+    "parentWorkItemTitle": "F",
+}
+
+# Long free text values such as commit messages are cut to this many characters
+MAX_VALUE_LENGTH = 80
+
+# Description of the encoding sent to the model ahead of the data
+FORMAT_DESCRIPTION = (
+    "The data is CSV with a header row, one record per row. "
+    "Values in the columns listed in the legend are replaced by short codes, use the legend to decode them. "
+    "Times are UTC."
+)
+
+_encoding = None
+# Set when the encoding cannot be loaded, for example offline without a cached copy, so loading it is only tried once
+_encoding_unavailable = tiktoken is None
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of the text with the local tokenizer, or estimates them when tiktoken is not installed
+    or its encoding cannot be loaded.
+    """
+    global _encoding, _encoding_unavailable
+    if _encoding is None and not _encoding_unavailable:
+        try:
+            _encoding = tiktoken.get_encoding(config.prompt_tokenizer_encoding)
+        except Exception as e:
+            logging.warning(f"Unable to load the {config.prompt_tokenizer_encoding} tokenizer encoding, estimating token counts instead: {e}")
+            _encoding_unavailable = True
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+def count_entity_tokens(entities: list) -> int:
+    """
+    Counts the tokens of the entities when every one of them is encoded.
+    """
+    return count_tokens(_encode_rows(sorted(entities, key=_sort_key), PROMPT_COLUMNS))
+
+def encode_entities(entities: list, token_budget: int = None, columns: list = None) -> dict:
+    """
+    Encodes the entities as a compact, dictionary encoded CSV that fits the token budget.
+    When every entity does not fit, an evenly spaced sample ordered by finish time is encoded instead.
+    Returns the encoded text with its token count and the number of rows encoded out of the total.
+    """
+    token_budget = token_budget or config.prompt_token_budget
+    columns = columns or PROMPT_COLUMNS
+    rows = sorted(entities, key=_sort_key)
+    text = _encode_rows(rows, columns)
+    tokens = count_tokens(text)
+    selected = len(rows)
+
+    if tokens > token_budget:
+        # Find the largest sample that fits the budget
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(_encode_rows(_sample(rows, middle), columns)) <= token_budget:
+                low = middle
+            else:
+                high = middle - 1
+        selected = low
+        text = _encode_rows(_sample(rows, selected), columns)
+        tokens = count_tokens(text)
+        logging.info(f"Prompt data sampled to {selected} of {len(rows)} rows to fit {token_budget} tokens")
+
+    return {"text": text, "tokens": tokens, "rows": selected, "totalRows": len(rows)}
+
+def _sort_key(entity) -> str:
+    # Builds are ordered by finish time and rollups by day
+    return str(entity.get("finishTime", entity.get("day")))
+
+def _sample(rows: list, count: int) -> list:
+    if count >= len(rows):
+        return rows
+    return [rows[i * len(rows) // count] for i in range(count)]
+
+def _encode_rows(rows: list, columns: list) -> str:
+    # Leave out the columns that have no value in any row
+    columns = [column for column in columns if any(row.get(column) not in (None, "") for row in rows)]
+    dictionaries = {column: {} for column in columns if column in DICTIONARY_COLUMNS}
+
+    data = io.StringIO()
+    writer = csv.writer(data, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_encode_value(column, row.get(column), dictionaries) for column in columns])
+
+    legend = []
+    for column, codes in dictionaries.items():
+        if codes:
+            legend.append(column + ": " + "; ".join(f"{code}={value}" for value, code in codes.items()))
+
+    return FORMAT_DESCRIPTION + "\n\nLegend\n" + "\n".join(legend) + "\n\nBuilds\n" + data.getvalue()
+
+def _encode_value(column: str, value, dictionaries: dict) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if isinstance(value, float):
+        value = round(value, 1)
+    value = str(value)[:MAX_VALUE_LENGTH]
+    if column in dictionaries and value != "":
+        codes = dictionaries[column]
+        if value not in codes:
+            codes[value] = DICTIONARY_COLUMNS[column] + str(len(codes))
+        return codes[value]
+    return value
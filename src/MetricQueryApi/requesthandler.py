@@ -1,4 +1,3 @@
-from datetime import datetime
 import logging
 
 # The JSON payload that is sent to the webhook must be in the correct format for the webhook to be able to parse it.
@@ -7,6 +6,9 @@ import logging
 #   "message": string,
 #   "fromDateTime": datetime,
 # }
+# Optionally "mode": "single" or "mapreduce" can be sent, by default map-reduce is only used when the data does not fit a single prompt
+# Optionally "source": "builds" or "rollups" can be sent, rollups answer trend questions from one row per repository, pipeline and day
+# Optionally "includeMetrics": bool can be sent to add build and DORA metrics computed per pipeline to the prompt
 
 
 # Create def to parse the JSON payload, check correct types and return the values
@@ -15,7 +17,7 @@ def parse_request(req):
     try:
         for key in req.keys():
             if key in req:
-                if isinstance(req[key], (str, datetime.fromisoformat)):
+                if isinstance(req[key], (str, bool)):
                     parsedValues[key] = req[key]
                 else:
                     logging.info(f"Incorrect type for {key} in request")
@@ -1,34 +1,102 @@
 from azure.data.tables import TableClient
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+from shared_code import clients
+from shared_code import telemetry
+from shared_code import timeindex
 from . import config
 
+# Prefix of the day rows of a rollup partition and the partition listing every rollup partition, must match the collector
+ROLLUP_DAY_PREFIX = "day|"
+ROLLUP_INDEX_PARTITION_KEY = "pipelines"
+
+# Columns of the day rows of the rollups read by the query api
+ROLLUP_COLUMNS = [
+    "repository",
+    "pipelineName",
+    "day",
+    "builds",
+    "succeeded",
+    "partiallySucceeded",
+    "failed",
+    "canceled",
+    "otherResults",
+    "queueSecondsSum",
+    "runSecondsSum",
+    "runUnder1m",
+    "runUnder5m",
+    "runUnder10m",
+    "runUnder30m",
+    "runUnder1h",
+    "runOver1h",
+    "distinctContributors",
+]
+
+# Partition of the rows of the work item table, must match the collector
+WORK_ITEM_PARTITION_KEY = "workItem"
+
 def connect_to_table_service() -> TableClient:
     """
-    Connects to an Azure Table client and returns the TableClient object.
+    Returns the shared Azure Table client of this worker.
+    """
+    return clients.get_table_client(config.storage_connection_string, config.storage_table_name)
+
+def get_entity(table_name: str, partition_key: str, row_key: str):
+    """
+    Reads a single entity from the given table, returns None if it does not exist.
     """
-    table_client = TableClient.from_connection_string(conn_str=config.storage_connection_string, table_name=config.storage_table_name)
     try:
-       table_client.create_table()
-       logging.debug("Created table")
-    except:
-        logging.info("Table already exists or unable to create table")
-    return table_client
+        return clients.call_table(config.storage_connection_string, table_name, lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key))
+    except Exception as e:
+        logging.debug(f"Unable to read {partition_key}/{row_key} from {table_name}: {e}")
+        return None
 
-def query_table_using_time(fromDateTime: datetime):
+def upsert_entity(table_name: str, entity: dict):
     """
-    Queries the Azure Table using the given datetime and returns the result.
+    Upserts a single entity into the given table.
     """
-    table_client = connect_to_table_service()
+    clients.call_table(config.storage_connection_string, table_name, lambda table_client: table_client.upsert_entity(entity))
+
+def query_rollups(fromDateTime: datetime):
+    """
+    Queries the daily rollups of every repository and pipeline since the day of the given datetime and returns them with mean durations.
+    The rollup partitions are listed from the index partition, then the day rows of each partition in the range are queried concurrently.
+    """
+    fromDateTime = timeindex.parse_datetime(fromDateTime)
     try:
-        filter_str = f"finishTime ge datetime'{fromDateTime}'"
-        entities = []
-        for entity_page in table_client.query_entities(query_filter=filter_str).by_page():
-            for entity in entity_page:
-                entities.append(entity)
-        logging.info(f"Queried table for {fromDateTime}")
+        with telemetry.span("table.query", table=config.rollup_table_name) as attributes:
+            index = clients.call_table(config.storage_connection_string, config.rollup_table_name, lambda table_client: list(table_client.query_entities(query_filter="PartitionKey eq @partition", parameters={"partition": ROLLUP_INDEX_PARTITION_KEY}, select=["RowKey"])))
+            attributes["entities"] = len(index)
+        partitions = [entity["RowKey"] for entity in index]
+        days = {
+            "first": ROLLUP_DAY_PREFIX + fromDateTime.strftime(timeindex.TIME_INDEX_PARTITION_FORMAT),
+            "last": ROLLUP_DAY_PREFIX + datetime.now(timezone.utc).strftime(timeindex.TIME_INDEX_PARTITION_FORMAT),
+        }
+
+        def query_partition(partition):
+            parameters = {"partition": partition, **days}
+            with telemetry.span("table.query", table=config.rollup_table_name) as attributes:
+                partition_rollups = clients.call_table(config.storage_connection_string, config.rollup_table_name, lambda table_client: list(table_client.query_entities(query_filter="PartitionKey eq @partition and RowKey ge @first and RowKey le @last", parameters=parameters, select=ROLLUP_COLUMNS)))
+                attributes["entities"] = len(partition_rollups)
+            return partition_rollups
+
+        rollups = []
+        if partitions:
+            with ThreadPoolExecutor(max_workers=max(1, min(config.query_workers, len(partitions)))) as executor:
+                for partition_rollups in executor.map(telemetry.propagate(query_partition), partitions):
+                    rollups.extend(partition_rollups)
     except:
-        raise ValueError(f"Unable to query table for {fromDateTime}")
-    logging.info(f"Found {len(entities)} entities")
-    logging.debug(f"Entities: {entities}")
-    return entities
\ No newline at end of file
+        raise ValueError(f"Unable to query rollups for {fromDateTime}")
+    for rollup in rollups:
+        builds = rollup.get("builds") or 0
+        rollup["meanQueueSeconds"] = rollup.get("queueSecondsSum", 0) / builds if builds else None
+        rollup["meanRunSeconds"] = rollup.get("runSecondsSum", 0) / builds if builds else None
+    logging.info(f"Found {len(rollups)} rollups from {len(partitions)} partitions")
+    return rollups
+
+def get_work_item(work_item_id: str):
+    """
+    Reads the attributes of a single work item from the work item table, returns None if it is not there.
+    """
+    return get_entity(config.work_item_table_name, WORK_ITEM_PARTITION_KEY, work_item_id)
@@ -0,0 +1,68 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from shared_code import telemetry
+from shared_code.ttlcache import TtlLruCache
+from . import config
+from . import storagehandler
+
+# Work item attributes joined onto the builds that reference them
+WORK_ITEM_COLUMNS = ["workItemType", "title", "parentWorkItemId", "parentWorkItemTitle"]
+
+# The cache lives at module level so it stays warm across invocations on the same worker
+_cache = TtlLruCache(config.work_item_cache_size, config.work_item_cache_ttl)
+
+def get_work_items(work_item_ids) -> dict:
+    """
+    Returns the attributes of the given work items keyed by work item id, with the etag of their row in the work item table.
+    Work items missing from the work item table have no attributes. Work items not in the in-process cache are read concurrently with point reads.
+    """
+    work_items = {}
+    missing_ids = []
+    for work_item_id in set(work_item_ids):
+        cached = _cache.get(work_item_id)
+        if cached is None:
+            missing_ids.append(work_item_id)
+        else:
+            work_items[work_item_id] = cached
+
+    def read(work_item_id):
+        entity = storagehandler.get_work_item(work_item_id)
+        if not entity:
+            return {}
+        work_item = {column: entity.get(column) for column in WORK_ITEM_COLUMNS if entity.get(column) is not None}
+        work_item["etag"] = entity.metadata.get("etag")
+        return work_item
+
+    if missing_ids:
+        with telemetry.span("table.read", table=config.work_item_table_name, entities=len(missing_ids)):
+            with ThreadPoolExecutor(max_workers=max(1, min(config.query_workers, len(missing_ids)))) as executor:
+                for work_item_id, work_item in zip(missing_ids, executor.map(telemetry.propagate(read), missing_ids)):
+                    # Missing work items are cached too, so they are not read again on every question
+                    _cache.put(work_item_id, work_item)
+                    work_items[work_item_id] = work_item
+        logging.info(f"Read {len(missing_ids)} of {len(work_items)} work items from the work item table")
+    return work_items
+
+def get_referenced_work_items(entities: list) -> dict:
+    """
+    Returns the work items referenced by the build entities, keyed by work item id.
+    """
+    return get_work_items(entity["workItemId"] for entity in entities if entity.get("workItemId"))
+
+def join_work_items(entities: list) -> list:
+    """
+    Returns copies of the build entities with the attributes of their work item added.
+    The cached entities are left as they are.
+    """
+    work_items = get_referenced_work_items(entities)
+    joined = []
+    for entity in entities:
+        work_item = work_items.get(entity.get("workItemId"), {})
+        joined.append({**entity, **{column: work_item[column] for column in WORK_ITEM_COLUMNS if column in work_item}})
+    return joined
+
+def clear():
+    """
+    Empties the in-process work item cache.
+    """
+    _cache.clear()
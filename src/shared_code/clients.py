@@ -0,0 +1,100 @@
+from azure.data.tables import TableClient
+from azure.core.exceptions import ResourceExistsError, ServiceRequestError
+from requests.adapters import HTTPAdapter
+import logging
+import threading
+import requests
+import openai
+
+# Clients are kept at module level so they are created once per worker process and reused by every invocation
+_table_clients = {}
+_http_sessions = {}
+_openai_settings = None
+_lock = threading.Lock()
+
+# Optional function creating the client of a table name in place of Azure Table storage, set by the benchmarks
+_table_client_factory = None
+
+def set_table_client_factory(factory):
+    """
+    Replaces Azure Table storage with the clients returned by factory(table_name), or restores it when factory is None.
+    """
+    global _table_client_factory
+    _table_client_factory = factory
+
+def get_table_client(connection_string: str, table_name: str) -> TableClient:
+    """
+    Returns the shared TableClient for the table, creating it and making sure the table exists on first use.
+    When a table client factory is set its client is returned instead.
+    """
+    if _table_client_factory is not None:
+        return _table_client_factory(table_name)
+    key = (connection_string, table_name)
+    table_client = _table_clients.get(key)
+    if table_client is not None:
+        return table_client
+    with _lock:
+        table_client = _table_clients.get(key)
+        if table_client is None:
+            table_client = TableClient.from_connection_string(conn_str=connection_string, table_name=table_name)
+            try:
+                table_client.create_table()
+                logging.debug(f"Created table {table_name}")
+            except ResourceExistsError:
+                logging.debug(f"Table {table_name} already exists")
+            except Exception as e:
+                logging.info(f"Unable to create table {table_name}: {e}")
+            _table_clients[key] = table_client
+    return table_client
+
+def reset_table_client(connection_string: str, table_name: str):
+    """
+    Drops the shared TableClient for the table so the next call reconnects.
+    """
+    with _lock:
+        table_client = _table_clients.pop((connection_string, table_name), None)
+    if table_client is not None:
+        try:
+            table_client.close()
+        except Exception as e:
+            logging.debug(f"Unable to close table client for {table_name}: {e}")
+
+def call_table(connection_string: str, table_name: str, operation):
+    """
+    Calls operation with the shared TableClient, reconnecting and retrying once if the connection failed.
+    """
+    try:
+        return operation(get_table_client(connection_string, table_name))
+    except ServiceRequestError as e:
+        logging.info(f"Connection to table {table_name} failed, reconnecting: {e}")
+        reset_table_client(connection_string, table_name)
+        return operation(get_table_client(connection_string, table_name))
+
+def get_http_session(name: str, pool_size: int = 10) -> requests.Session:
+    """
+    Returns the shared keep-alive HTTP session with the given name, creating it on first use.
+    """
+    with _lock:
+        session = _http_sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_sessions[name] = session
+        return session
+
+def get_openai_client(api_key: str, api_base: str, api_type: str = "azure", api_version: str = "2023-05-15"):
+    """
+    Returns the openai module configured with the given settings, only reconfiguring it when the settings change.
+    """
+    global _openai_settings
+    settings = (api_key, api_base, api_type, api_version)
+    with _lock:
+        if _openai_settings != settings:
+            openai.api_key = api_key
+            openai.api_base = api_base
+            openai.api_type = api_type
+            openai.api_version = api_version
+            _openai_settings = settings
+    return openai
@@ -0,0 +1,146 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+from azure.data.tables import UpdateMode
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+import re
+import uuid
+from . import clients
+
+# Settings are read from the environment like the function configs, so the api queueing jobs and the worker running them share them
+STORAGE_CONNECTION_STRING = os.environ.get("STORAGE_CONNECTION_STRING")
+# Table holding the status of queued collection jobs and the lease of each running collection
+JOB_TABLE_NAME = os.environ.get("JOB_TABLE_NAME", "collectionjobs")
+# Seconds after which the lease of a collection that never finished is taken over by another job
+COLLECTION_LEASE_SECONDS = int(os.environ.get("COLLECTION_LEASE_SECONDS", "600"))
+# Number of times claiming a lease is retried when another job changed it first
+LEASE_MAX_RETRIES = int(os.environ.get("STORAGE_MAX_RETRIES", "4"))
+
+# Partitions of the job table holding the status of every job and the lease of every collection key
+JOB_PARTITION_KEY = "job"
+LEASE_PARTITION_KEY = "lease"
+
+def get_collection_key(request: dict) -> str:
+    """
+    Returns the key of the builds a collection request collects, requests with the same key can share a collection.
+    """
+    if "buildId" in request:
+        return "build|" + str(request["buildId"])
+    return "repository|" + request["repositoryId"] + ("|full" if request.get("fullRefresh") else "|incremental")
+
+def create_job(request: dict) -> dict:
+    """
+    Records a queued collection job for the request and returns the message to put on the collection queue,
+    with the job id, the request and the time the job was queued.
+    """
+    job = {
+        "jobId": str(uuid.uuid4()),
+        "request": request,
+        "queuedAt": datetime.now(timezone.utc).isoformat(),
+    }
+    set_job(job["jobId"], {
+        "status": "queued",
+        "request": json.dumps(request),
+        "collectionKey": get_collection_key(request),
+        "queuedAt": job["queuedAt"],
+    })
+    logging.info(f"Queued collection job {job['jobId']} for {get_collection_key(request)}")
+    return job
+
+def get_job_status(job_id: str) -> dict:
+    """
+    Returns the status of a collection job, with the status and summary of the collection it was coalesced into if any,
+    or None if there is no such job.
+    """
+    entity = get_job(job_id)
+    if entity is None:
+        return None
+    job = _to_job_status(job_id, entity)
+    if entity.get("coalescedInto"):
+        coalesced_into = get_job(entity["coalescedInto"])
+        if coalesced_into is not None:
+            job["coalescedStatus"] = coalesced_into.get("status")
+            if coalesced_into.get("summary"):
+                job["summary"] = json.loads(coalesced_into["summary"])
+    return job
+
+def get_job(job_id: str):
+    """
+    Returns the status row of a collection job, or None if there is no such job.
+    """
+    return _get_entity(JOB_PARTITION_KEY, _table_key(job_id))
+
+def set_job(job_id: str, fields: dict):
+    """
+    Merges the fields into the status row of a collection job.
+    """
+    entity = {"PartitionKey": JOB_PARTITION_KEY, "RowKey": _table_key(job_id), **fields}
+    clients.call_table(STORAGE_CONNECTION_STRING, JOB_TABLE_NAME, lambda table_client: table_client.upsert_entity(entity))
+
+def acquire_collection_lease(collection_key: str, job_id: str, queued_at: datetime) -> tuple:
+    """
+    Claims the collection of a repository or build for a job, with optimistic concurrency so only one job collects a key at a time.
+    Returns ("acquired", None) when the job should collect, ("covered", job id) when a collection that started after the job was queued
+    is running or has completed, or ("busy", job id) when an earlier collection of the same key is still running.
+    """
+    row_key = _table_key(collection_key)
+    for attempt in range(LEASE_MAX_RETRIES + 1):
+        existing = _get_entity(LEASE_PARTITION_KEY, row_key)
+        now = datetime.now(timezone.utc)
+        if existing is not None:
+            started_at = datetime.fromisoformat(existing["startedAt"])
+            # A running lease that outlived the timeout belongs to a worker that died, so it can be taken over
+            running = existing["status"] == "running" and now - started_at < timedelta(seconds=COLLECTION_LEASE_SECONDS)
+            if started_at >= queued_at and (running or existing["status"] == "completed"):
+                return "covered", existing["jobId"]
+            if running:
+                return "busy", existing["jobId"]
+
+        lease = {"PartitionKey": LEASE_PARTITION_KEY, "RowKey": row_key, "jobId": job_id, "status": "running", "startedAt": now.isoformat()}
+        try:
+            if existing is None:
+                clients.call_table(STORAGE_CONNECTION_STRING, JOB_TABLE_NAME, lambda table_client: table_client.create_entity(lease))
+            else:
+                clients.call_table(STORAGE_CONNECTION_STRING, JOB_TABLE_NAME, lambda table_client: table_client.update_entity(lease, mode=UpdateMode.REPLACE, etag=existing.metadata["etag"], match_condition=MatchConditions.IfNotModified))
+            return "acquired", None
+        except (ResourceExistsError, ResourceModifiedError):
+            logging.info(f"Lease of {collection_key} changed while claiming it, retrying")
+    raise ValueError(f"Unable to claim the collection of {collection_key}")
+
+def release_collection_lease(collection_key: str, job_id: str, status: str):
+    """
+    Marks the collection held by the job as completed or failed, unless another job has since taken the lease over.
+    """
+    row_key = _table_key(collection_key)
+    existing = _get_entity(LEASE_PARTITION_KEY, row_key)
+    if existing is None or existing["jobId"] != job_id:
+        logging.info(f"Lease of {collection_key} is no longer held by job {job_id}")
+        return
+    lease = {**existing, "status": status, "finishedAt": datetime.now(timezone.utc).isoformat()}
+    try:
+        clients.call_table(STORAGE_CONNECTION_STRING, JOB_TABLE_NAME, lambda table_client: table_client.update_entity(lease, mode=UpdateMode.REPLACE, etag=existing.metadata["etag"], match_condition=MatchConditions.IfNotModified))
+    except ResourceModifiedError:
+        logging.info(f"Lease of {collection_key} was taken over before job {job_id} released it")
+
+def _to_job_status(job_id: str, entity: dict) -> dict:
+    job = {"jobId": job_id}
+    for field in ["status", "queuedAt", "startedAt", "finishedAt", "attempts", "coalescedInto", "waitingFor", "error"]:
+        if entity.get(field) not in (None, ""):
+            job[field] = entity[field]
+    job["request"] = json.loads(entity.get("request") or "{}")
+    if entity.get("summary"):
+        job["summary"] = json.loads(entity["summary"])
+    return job
+
+def _get_entity(partition_key: str, row_key: str):
+    try:
+        return clients.call_table(STORAGE_CONNECTION_STRING, JOB_TABLE_NAME, lambda table_client: table_client.get_entity(partition_key=partition_key, row_key=row_key))
+    except Exception as e:
+        logging.debug(f"Unable to read {partition_key}/{row_key} from {JOB_TABLE_NAME}: {e}")
+        return None
+
+def _table_key(value: str) -> str:
+    # Table keys cannot contain these characters
+    return re.sub(r"[/\\#?\x00-\x1f\x7f]", "_", value)
@@ -0,0 +1,106 @@
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Columns of the build entities read by the metrics engine
+METRIC_COLUMNS = ["repository", "pipelineName", "requestedFor", "workItemId", "result", "queueTime", "startTime", "finishTime"]
+
+# Columns the metrics can be grouped by
+GROUP_BY_COLUMNS = ["repository", "pipelineName", "requestedFor", "workItemId"]
+
+# Build results counted as a failed change, canceled builds are left out of the rates
+FAILED_RESULTS = ["failed", "partiallySucceeded"]
+
+def to_frame(entities: list) -> pd.DataFrame:
+    """
+    Loads the build entities into a columnar frame with UTC datetimes.
+    """
+    frame = pd.DataFrame.from_records([{column: entity.get(column) for column in METRIC_COLUMNS} for entity in entities], columns=METRIC_COLUMNS)
+    for column in ["queueTime", "startTime", "finishTime"]:
+        frame[column] = pd.to_datetime(frame[column], utc=True, errors="coerce")
+    for column in GROUP_BY_COLUMNS:
+        frame[column] = frame[column].fillna("").astype(str)
+    return frame
+
+def get_period_days(from_date_time: datetime) -> float:
+    """
+    Returns the number of days from the given UTC datetime until now, at least one, used as the period of the deployment frequency.
+    """
+    return max((datetime.now(timezone.utc) - from_date_time).total_seconds() / 86400, 1)
+
+def compute_metrics(entities: list, group_by: str = "pipelineName", period_days: float = None) -> list:
+    """
+    Computes build and DORA metrics for each group of builds.
+    Deployment frequency is the number of successful builds per day over the period, which defaults to the span of the builds.
+    Time to restore is measured per pipeline from the first failure of a failing streak to the next successful build.
+    Returns one dictionary of metrics per group.
+    """
+    if group_by not in GROUP_BY_COLUMNS:
+        raise ValueError(f"Unable to group metrics by {group_by}, expected one of {GROUP_BY_COLUMNS}")
+    frame = to_frame(entities)
+    if frame.empty:
+        return []
+
+    if period_days is None:
+        period_days = max((frame["finishTime"].max() - frame["finishTime"].min()).total_seconds() / 86400, 1)
+
+    frame["succeeded"] = frame["result"] == "succeeded"
+    frame["failed"] = frame["result"].isin(FAILED_RESULTS)
+    frame["counted"] = frame["succeeded"] | frame["failed"]
+    frame["queueSeconds"] = (frame["startTime"] - frame["queueTime"]).dt.total_seconds()
+    frame["runSeconds"] = (frame["finishTime"] - frame["startTime"]).dt.total_seconds()
+    frame["restoreSeconds"] = _restore_seconds(frame)
+
+    grouped = frame.groupby(group_by, sort=True)
+    metrics = pd.DataFrame({
+        "builds": grouped.size(),
+        "succeeded": grouped["succeeded"].sum(),
+        "failed": grouped["failed"].sum(),
+        "counted": grouped["counted"].sum(),
+        "meanQueueSeconds": grouped["queueSeconds"].mean(),
+        "meanRunSeconds": grouped["runSeconds"].mean(),
+        "meanTimeToRestoreSeconds": grouped["restoreSeconds"].mean(),
+        "restores": grouped["restoreSeconds"].count(),
+    })
+    counted = metrics["counted"].replace(0, np.nan)
+    metrics["successRate"] = metrics["succeeded"] / counted
+    metrics["changeFailureRate"] = metrics["failed"] / counted
+    metrics["deploymentFrequencyPerDay"] = metrics["succeeded"] / period_days
+    metrics = metrics.drop(columns="counted").reset_index()
+
+    logging.info(f"Computed metrics for {len(metrics)} groups of {len(frame)} builds by {group_by}")
+    # Replace NaN with None so the metrics serialize to JSON nulls
+    return [{key: _to_python(value) for key, value in row.items()} for row in metrics.to_dict(orient="records")]
+
+def format_metrics_for_prompt(metrics: list) -> str:
+    """
+    Formats computed metrics as CSV for use as pre-computed context in a prompt.
+    """
+    if not metrics:
+        return ""
+    frame = pd.DataFrame.from_records(metrics).round(3)
+    return "Pre-computed build metrics, use these numbers rather than recounting the builds:\n" + frame.to_csv(index=False)
+
+def _restore_seconds(frame: pd.DataFrame) -> pd.Series:
+    # Order each pipeline's builds by finish time, a failing streak starts at a failure whose previous build did not fail
+    ordered = frame.sort_values(["repository", "pipelineName", "finishTime"])
+    pipelines = ordered.groupby(["repository", "pipelineName"], sort=False)
+    previous_failed = pipelines["failed"].shift(1, fill_value=False).astype(bool)
+    streak_start = ordered["failed"] & ~previous_failed
+
+    # The finish time of the next successful build in the same pipeline
+    success_time = ordered["finishTime"].where(ordered["succeeded"])
+    next_success = success_time.groupby([ordered["repository"], ordered["pipelineName"]], sort=False).bfill()
+
+    restore = (next_success - ordered["finishTime"]).dt.total_seconds().where(streak_start)
+    return restore.reindex(frame.index)
+
+def _to_python(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
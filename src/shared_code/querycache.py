@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from . import timeindex
+
+# Maximum number of entities held in the in-process query cache before windows are evicted
+QUERY_CACHE_MAX_ENTITIES = int(os.environ.get("QUERY_CACHE_MAX_ENTITIES", "50000"))
+# Number of seconds a cached window is refreshed incrementally before it is reloaded in full
+QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", "900"))
+# Number of seconds a refresh reads back before the previous read of the window, covering clock skew and writes still in flight
+QUERY_CACHE_REFRESH_SKEW = int(os.environ.get("QUERY_CACHE_REFRESH_SKEW_SECONDS", "120"))
+# Optional directory evicted windows are spilled to, disabled when not set
+QUERY_CACHE_DIR = os.environ.get("QUERY_CACHE_DIR")
+
+# Cached entity sets keyed by the start of their time window, kept at module level so they stay warm across invocations
+_windows = OrderedDict()
+# Windows evicted to disk, keyed by the start of their time window with the path of the spill file
+_spilled = {}
+# Guards the dictionaries above and the counters, it is never held across table or disk I/O
+_lock = threading.Lock()
+# One lock per window start, held while the window is loaded, refreshed or read so each window is only queried once at a time
+_window_locks = {}
+
+# Hit/miss counters, cumulative for the lifetime of the worker
+stats = {"hits": 0, "misses": 0, "refreshedEntities": 0, "evictions": 0, "spills": 0, "spillHits": 0}
+
+def get_entities(fromDateTime) -> list:
+    """
+    Returns the builds that finished since the given datetime, served from the cache when possible.
+    A cached window starting at or before the requested datetime is refreshed with only the builds written to the time index since it was last read.
+    Requests for different windows query the table concurrently, requests for the same window wait for a single load.
+    """
+    fromDateTime = timeindex.parse_datetime(fromDateTime)
+    with _lock:
+        start, window, spill_path = _find_window(fromDateTime)
+    if spill_path is not None:
+        window = _read_spill(spill_path)
+        if window is not None:
+            _count("spillHits")
+    if window is None or _is_stale(window):
+        if window is not None:
+            # The stale window is replaced by one loaded from the requested datetime, so it is dropped rather than left to eviction
+            with _lock:
+                if _windows.get(start) is window:
+                    del _windows[start]
+        start, window = fromDateTime, None
+    with _lock:
+        window_lock = _window_locks.setdefault(start, threading.Lock())
+
+    with window_lock:
+        if window is None:
+            # Another request may have loaded the window while this one waited for the lock
+            with _lock:
+                window = _windows.get(start)
+            if window is None or _is_stale(window):
+                window = _load_window(fromDateTime)
+                _count("misses")
+            else:
+                _count("hits")
+        else:
+            _count("hits")
+            _refresh_window(window)
+        entities = [entity for entity in window["entities"].values() if entity["finishTime"] >= fromDateTime]
+
+    with _lock:
+        _windows[start] = window
+        _windows.move_to_end(start)
+        evicted = _evict()
+    for evicted_start, evicted_window in evicted:
+        _write_spill(evicted_start, evicted_window)
+    logging.info(f"Query cache stats: {stats}")
+    return entities
+
+def clear():
+    """
+    Empties the cache, removes spill files and resets the counters.
+    """
+    with _lock:
+        _windows.clear()
+        _window_locks.clear()
+        for path in _spilled.values():
+            _remove_spill_file(path)
+        _spilled.clear()
+        for key in stats:
+            stats[key] = 0
+
+def _find_window(fromDateTime):
+    # Use the narrowest cached window that still covers the requested datetime, a spilled window is claimed here and read by the caller
+    starts = [start for start in list(_windows) + list(_spilled) if start <= fromDateTime]
+    if not starts:
+        return None, None, None
+    start = max(starts)
+    if start in _windows:
+        return start, _windows[start], None
+    return start, None, _spilled.pop(start)
+
+def _is_stale(window) -> bool:
+    return time.monotonic() - window["loadedAt"] > QUERY_CACHE_TTL
+
+def _count(stat: str, value: int = 1):
+    with _lock:
+        stats[stat] += value
+
+def _load_window(fromDateTime):
+    readAt = datetime.now(timezone.utc)
+    entities = timeindex.query_table_using_time(fromDateTime)
+    window = {"entities": {}, "from": fromDateTime, "readAt": readAt, "loadedAt": time.monotonic()}
+    _merge(window, entities)
+    return window
+
+def _refresh_window(window):
+    # Builds are found by when they were written rather than when they finished, so builds collected late into days already cached are read too
+    # Builds written within the skew margin are read again, the merge keys them so they are not duplicated
+    readAt = datetime.now(timezone.utc)
+    entities = timeindex.query_table_written_since(window["from"], window["readAt"] - timedelta(seconds=QUERY_CACHE_REFRESH_SKEW))
+    window["readAt"] = readAt
+    _count("refreshedEntities", len(entities))
+    _merge(window, entities)
+
+def _merge(window, entities):
+    for entity in entities:
+        window["entities"][(entity["PartitionKey"], entity["RowKey"])] = entity
+
+def _evict() -> list:
+    # Evict the least recently used windows until the total number of cached entities fits the limit, the caller spills them after releasing the lock
+    evicted = []
+    while len(_windows) > 1 and sum(len(window["entities"]) for window in _windows.values()) > QUERY_CACHE_MAX_ENTITIES:
+        start, window = _windows.popitem(last=False)
+        stats["evictions"] += 1
+        evicted.append((start, window))
+    return evicted
+
+def _write_spill(start, window):
+    if not QUERY_CACHE_DIR:
+        return
+    path = os.path.join(QUERY_CACHE_DIR, f"window-{int(start.timestamp())}.pickle")
+    try:
+        os.makedirs(QUERY_CACHE_DIR, exist_ok=True)
+        with _lock:
+            window_lock = _window_locks.setdefault(start, threading.Lock())
+        # Hold the window lock so the window is not refreshed while it is written
+        with window_lock:
+            with open(path, "wb") as spill_file:
+                pickle.dump(window, spill_file)
+        with _lock:
+            _spilled[start] = path
+            stats["spills"] += 1
+    except Exception as e:
+        logging.info(f"Unable to spill query cache window to {path}: {e}")
+
+def _read_spill(path):
+    try:
+        with open(path, "rb") as spill_file:
+            window = pickle.load(spill_file)
+    except Exception as e:
+        logging.info(f"Unable to read query cache window from {path}: {e}")
+        window = None
+    _remove_spill_file(path)
+    return window
+
+def _remove_spill_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,138 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+# "off" disables instrumentation, "log" emits one structured summary per invocation, "otel" also exports every span through OpenTelemetry
+TELEMETRY_MODE = os.environ.get("TELEMETRY_MODE", "log").lower()
+
+# Recorder of the invocation running in the current context
+_current = contextvars.ContextVar("telemetry_recorder", default=None)
+
+class _NullSpan:
+    """
+    The span used when instrumentation is off or no invocation is being recorded, it records nothing.
+    """
+
+    def __enter__(self):
+        # Callers write attributes into the returned dictionary, so every span gets its own that is thrown away
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Recorder:
+    """
+    Aggregates the spans of one invocation per stage: count, total and max duration, sums of numeric attributes and counts of other values.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, attributes: dict):
+        with self.lock:
+            summary = self.stages.setdefault(stage, {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0})
+            summary["count"] += 1
+            summary["totalSeconds"] += seconds
+            summary["maxSeconds"] = max(summary["maxSeconds"], seconds)
+            for key, value in attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    summary[key] = summary.get(key, 0) + value
+                else:
+                    counts = summary.setdefault(key, {})
+                    counts[str(value)] = counts.get(str(value), 0) + 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {"invocation": self.name, "totalSeconds": time.perf_counter() - self.start, "stages": self.stages}
+
+class _Span:
+    def __init__(self, recorder: _Recorder, stage: str, attributes: dict):
+        self.recorder = recorder
+        self.stage = stage
+        self.attributes = attributes
+        self.otel_span = None
+
+    def __enter__(self):
+        if trace is not None and TELEMETRY_MODE == "otel":
+            self.otel_span = trace.get_tracer(__name__).start_span(self.stage)
+        self.start = time.perf_counter()
+        return self.attributes
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.recorder.record(self.stage, seconds, self.attributes)
+        if self.otel_span is not None:
+            for key, value in self.attributes.items():
+                self.otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+            self.otel_span.end()
+        return False
+
+class _Invocation:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.recorder = _Recorder(self.name)
+        self.token = _current.set(self.recorder)
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        _current.reset(self.token)
+        logging.info(f"Invocation summary: {json.dumps(self.recorder.summary(), default=str)}")
+        return False
+
+def invocation(name: str):
+    """
+    Records every span of the function invocation and emits one structured summary when it ends.
+    """
+    if TELEMETRY_MODE == "off":
+        return _NULL_SPAN
+    return _Invocation(name)
+
+def span(stage: str, **attributes):
+    """
+    Times a stage of the current invocation. The attributes dictionary is returned so the caller can add attributes such as sizes and status codes.
+    Costs a single context lookup when instrumentation is off or no invocation is being recorded.
+    """
+    recorder = _current.get()
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, stage, attributes)
+
+def propagate(function):
+    """
+    Wraps the function so spans it records from a worker thread are added to the invocation of the calling thread.
+    """
+    recorder = _current.get()
+    if recorder is None:
+        return function
+
+    def run(*args, **kwargs):
+        token = _current.set(recorder)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+def current_summary() -> dict:
+    """
+    Returns the summary of the invocation recorded so far, or None if none is being recorded.
+    """
+    recorder = _current.get()
+    return recorder.summary() if recorder is not None else None
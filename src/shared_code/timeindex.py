@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from . import clients
+from . import telemetry
+
+# Settings are read from the environment like the function configs, so every function app querying the time index shares them
+STORAGE_CONNECTION_STRING = os.environ.get("STORAGE_CONNECTION_STRING")
+# Table holding a copy of every build partitioned by the day it finished, written by the collector
+TIME_INDEX_TABLE_NAME = os.environ.get("TIME_INDEX_TABLE_NAME", "buildsbyday")
+# Number of day partitions of the time index queried concurrently
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "8"))
+
+# Format of the day partitions of the time index table, must match the collector
+TIME_INDEX_PARTITION_FORMAT = "%Y-%m-%d"
+
+# Columns of the time index read by the query apis, for the prompt and the metrics engine
+BUILD_COLUMNS = [
+    "PartitionKey",
+    "RowKey",
+    "repository",
+    "pipelineName",
+    "result",
+    "buildReason",
+    "queueTime",
+    "startTime",
+    "finishTime",
+    "requestedFor",
+    "sourceBranch",
+    "workItemId",
+    "ciMessage",
+]
+
+def parse_datetime(value) -> datetime:
+    """
+    Parses an ISO 8601 datetime string into a UTC datetime, datetimes without a timezone are treated as UTC.
+    """
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def get_day_partitions(fromDateTime: datetime, toDateTime: datetime) -> list:
+    """
+    Returns the time index partitions covering the given time range.
+    """
+    day = fromDateTime.date()
+    partitions = []
+    while day <= toDateTime.date():
+        partitions.append(day.strftime(TIME_INDEX_PARTITION_FORMAT))
+        day += timedelta(days=1)
+    return partitions
+
+def query_table_using_time(fromDateTime: datetime):
+    """
+    Queries the time index table for builds that finished since the given datetime and returns the result.
+    Each day in the range is read from its own partition, the partitions are queried concurrently.
+    Only the columns in BUILD_COLUMNS are read, work item attributes are joined from the work item table when needed.
+    """
+    try:
+        fromDateTime = parse_datetime(fromDateTime)
+        partitions = get_day_partitions(fromDateTime, datetime.now(timezone.utc))
+
+        def query_partition(partition):
+            # Only the first day can contain builds that finished before the requested datetime
+            if partition == partitions[0]:
+                filter_str = "PartitionKey eq @partition and finishTime ge @fromDateTime"
+            else:
+                filter_str = "PartitionKey eq @partition"
+            parameters = {"partition": partition, "fromDateTime": fromDateTime}
+            with telemetry.span("table.query", table=TIME_INDEX_TABLE_NAME) as attributes:
+                partition_entities = clients.call_table(STORAGE_CONNECTION_STRING, TIME_INDEX_TABLE_NAME, lambda table_client: list(table_client.query_entities(query_filter=filter_str, parameters=parameters, select=BUILD_COLUMNS)))
+                attributes["entities"] = len(partition_entities)
+            return partition_entities
+
+        entities = []
+        with ThreadPoolExecutor(max_workers=max(1, min(QUERY_WORKERS, len(partitions)))) as executor:
+            for partition_entities in executor.map(telemetry.propagate(query_partition), partitions):
+                entities.extend(partition_entities)
+        logging.info(f"Queried {len(partitions)} day partitions for {fromDateTime}")
+    except:
+        raise ValueError(f"Unable to query table for {fromDateTime}")
+    logging.info(f"Found {len(entities)} entities")
+    logging.debug(f"Entities: {entities}")
+    return entities
+
+def query_table_written_since(fromDateTime: datetime, writtenSince: datetime):
+    """
+    Queries the time index table for builds that finished since fromDateTime and were written to the table since writtenSince,
+    using the Timestamp the table sets on every write. Builds collected late are found even when they finished long before.
+    The day partitions of the range are read with a single range query, as only a few builds are expected to match.
+    """
+    try:
+        fromDateTime = parse_datetime(fromDateTime)
+        partitions = get_day_partitions(fromDateTime, datetime.now(timezone.utc))
+        filter_str = "PartitionKey ge @firstPartition and PartitionKey le @lastPartition and Timestamp ge @writtenSince and finishTime ge @fromDateTime"
+        parameters = {"firstPartition": partitions[0], "lastPartition": partitions[-1], "writtenSince": writtenSince, "fromDateTime": fromDateTime}
+        with telemetry.span("table.query", table=TIME_INDEX_TABLE_NAME) as attributes:
+            entities = clients.call_table(STORAGE_CONNECTION_STRING, TIME_INDEX_TABLE_NAME, lambda table_client: list(table_client.query_entities(query_filter=filter_str, parameters=parameters, select=BUILD_COLUMNS)))
+            attributes["entities"] = len(entities)
+    except:
+        raise ValueError(f"Unable to query table for builds written since {writtenSince}")
+    logging.info(f"Found {len(entities)} entities written since {writtenSince}")
+    return entities